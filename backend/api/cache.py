@@ -0,0 +1,186 @@
+import datetime
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.views.decorators.http import condition
+from rest_framework import status
+from rest_framework.response import Response
+
+VERSION_KEY = 'version:{}'
+
+
+def is_shared_cache():
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if is_shared_cache():
+        return []
+    return [checks.Warning(
+        'Кэш хранится в памяти процесса: версии моделей, кэш ответов и '
+        'статистика не видны другим воркерам.',
+        hint='Укажите CACHE_BACKEND и CACHE_LOCATION общего кэша, '
+             'например Memcached из infra/docker-compose.yml.',
+        id='api.W001',
+    )]
+
+
+def version_key(model):
+    return VERSION_KEY.format(model._meta.label_lower)
+
+
+def get_versions(*models):
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        for key, version in missing.items():
+            cache.add(key, version, None)
+        versions.update(cache.get_many(list(missing)))
+    return tuple(versions.get(key, 0) for key in keys)
+
+
+def bump_versions(*models):
+    version = time.time_ns()
+    cache.set_many({version_key(model): version for model in models}, None)
+
+
+class VersionedIndex:
+    models = ()
+
+    def __init__(self):
+        self.version = None
+        self.checked_at = None
+
+    def build(self):
+        raise NotImplementedError
+
+    def refresh(self):
+        now = time.monotonic()
+        if (self.checked_at is not None
+                and now - self.checked_at
+                < settings.VERSION_CHECK_INTERVAL):
+            return
+        self.checked_at = now
+        version = get_versions(*self.models)
+        if version != self.version:
+            self.build()
+            self.version = version
+
+
+def recipe_fragment_key(recipe_id, version):
+    return f'recipe-fragment:{recipe_id}:{version}'
+
+
+def record_cache_access(name, hit):
+    key = f'stats:{name}:{"hits" if hit else "misses"}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def get_cache_stats(name):
+    stats = cache.get_many([f'stats:{name}:hits', f'stats:{name}:misses'])
+    hits = stats.get(f'stats:{name}:hits', 0)
+    misses = stats.get(f'stats:{name}:misses', 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0,
+    }
+
+
+def normalize_query_params(query_params):
+    return urlencode(sorted(
+        (key, value)
+        for key, values in query_params.lists()
+        for value in values
+    ))
+
+
+class AnonymousCacheMixin:
+    cache_models = ()
+    anonymous_cache_timeout = settings.ANONYMOUS_CACHE_TIMEOUT
+    anonymous_cache_name = 'anonymous'
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve,
+                                    request, *args, **kwargs)
+
+    def get_anonymous_cache_key(self, request):
+        key = (f'{request.path}?{normalize_query_params(request.query_params)}'
+               f':{get_versions(*self.cache_models)}')
+        return (f'{self.anonymous_cache_name}:'
+                f'{hashlib.md5(key.encode()).hexdigest()}')
+
+    def to_cached_data(self, data):
+        return data
+
+    def from_cached_data(self, data):
+        return data
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.get_anonymous_cache_key(request)
+        data = cache.get(key)
+        hit = data is not None
+        record_cache_access(self.anonymous_cache_name, hit)
+        if hit:
+            response = Response(self.from_cached_data(data))
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, self.to_cached_data(response.data),
+                          self.anonymous_cache_timeout)
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        return response
+
+
+def make_etag(*parts):
+    return hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest()
+
+
+def versions_last_modified(*models):
+    return datetime.datetime.fromtimestamp(max(get_versions(*models)) / 1e9,
+                                           tz=datetime.timezone.utc)
+
+
+class ConditionalGetMixin:
+    cache_models = ()
+    conditional_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list,
+                                         request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve,
+                                         request, *args, **kwargs)
+
+    def get_etag(self, request, *args, **kwargs):
+        return make_etag(request.path,
+                         normalize_query_params(request.query_params),
+                         *get_versions(*self.cache_models))
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return versions_last_modified(*self.cache_models)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        return condition(
+            etag_func=self.get_etag,
+            last_modified_func=self.get_last_modified
+        )(handler)(request, *args, **kwargs)
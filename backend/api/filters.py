@@ -1,6 +1,9 @@
 import django_filters
+from django.db.models import Exists, OuterRef
 from recipes.models import Ingredient, Recipe, Tag, UserRecipe
 
+from .search import ingredient_ngram_index, ranked_search, recipe_ngram_index
+
 
 class RecipeFilter(django_filters.FilterSet):
     is_favorited = django_filters.NumberFilter(method='filter_is_favorite')
@@ -16,23 +19,24 @@ class RecipeFilter(django_filters.FilterSet):
         to_field_name='slug',
         queryset=Tag.objects.all()
     )
+    search = django_filters.CharFilter(method='filter_search')
+
+    def filter_search(self, queryset, name, value):
+        return ranked_search(queryset, value, 'favorites_count',
+                             recipe_ngram_index)
 
     def filter_user_recipe(self, queryset, value, field, name=None):
         user = self.request.user
-        if not user.is_authenticated:
+        if not user.is_authenticated or value not in (0, 1):
             return queryset
-        for recipe in queryset:
-            UserRecipe.objects.get_or_create(
-                recipe=recipe,
-                user=user
-            )
-        if value == 0 or value == 1:
-            filter_kwargs = {
-                'userrecipe__user': user,
-                f'userrecipe__{field}': bool(value)
-            }
-            return queryset.filter(**filter_kwargs)
-        return queryset
+        user_recipes = UserRecipe.objects.filter(
+            user=user,
+            recipe=OuterRef('pk'),
+            **{field: True}
+        )
+        if value:
+            return queryset.filter(Exists(user_recipes))
+        return queryset.filter(~Exists(user_recipes))
 
     def filter_is_favorite(self, queryset, name, value):
         return self.filter_user_recipe(queryset,
@@ -49,17 +53,24 @@ class RecipeFilter(django_filters.FilterSet):
         fields = ['is_favorited',
                   'is_in_shopping_cart',
                   'author',
-                  'tags', ]
+                  'tags',
+                  'search', ]
 
 
 class IngredientFilter(django_filters.FilterSet):
     name = django_filters.CharFilter(
         field_name='name',
-        lookup_expr='startswith'
+        lookup_expr='istartswith'
     )
+    search = django_filters.CharFilter(method='filter_search')
+
+    def filter_search(self, queryset, name, value):
+        return ranked_search(queryset, value, 'usage_count',
+                             ingredient_ngram_index)
 
     class Meta:
         model = Ingredient
         fields = [
             'name',
+            'search',
         ]
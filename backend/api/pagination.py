@@ -1,16 +1,283 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+from collections import namedtuple
+from functools import cached_property, partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
+from .cache import get_versions
+from .signals import VERSIONED_MODELS
 
-class CustomPagination(PageNumberPagination):
+
+class CountStrategy:
+    timeout = settings.PAGINATION_COUNT_CACHE_TIMEOUT
+    estimate_threshold = settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+
+    def __init__(self):
+        self.is_approximate = False
+
+    def count(self, queryset):
+        if not queryset.query.where:
+            estimate = self.estimate(queryset.model)
+            if estimate is not None and estimate >= self.estimate_threshold:
+                self.is_approximate = True
+                return estimate
+        key = self.get_cache_key(queryset)
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, self.timeout)
+        return count
+
+    def get_cache_key(self, queryset):
+        sql, params = queryset.values('pk').query.sql_with_params()
+        models = [model for model in VERSIONED_MODELS
+                  if f'"{model._meta.db_table}"' in sql]
+        key = f'{sql}:{params}:{get_versions(*models)}'
+        return f'count:{hashlib.md5(key.encode()).hexdigest()}'
+
+    def estimate(self, model):
+        if connection.vendor != 'postgresql':
+            return None
+        key = f'estimate:{model._meta.db_table}'
+        estimate = cache.get(key)
+        if estimate is None:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    [model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            estimate = row[0] if row else 0
+            cache.set(key, estimate, self.timeout)
+        return estimate
+
+
+class CountingPaginator(Paginator):
+
+    def __init__(self, object_list, per_page, count_strategy, **kwargs):
+        self.count_strategy = count_strategy
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        return self.count_strategy.count(self.object_list)
+
+
+class KeysetPagination(BasePagination):
     page_size = 10
     page_size_query_param = 'limit'
     max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+        position, reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if reverse:
+            ordering = [self.invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position, ordering))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.page = results
+        return results
 
     def get_paginated_response(self, data):
         return Response({
-            'count': self.page.paginator.count,
             'next': self.get_next_link(),
             'previous': self.get_previous_link(),
             'results': data
         })
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset, view):
+        ordering = list(
+            queryset.query.order_by
+            or getattr(view, 'cursor_ordering', None)
+            or queryset.model._meta.ordering
+        )
+        if not ordering or ordering[-1].lstrip('-') not in ('pk', 'id'):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(position, ordering):
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_field(self, name):
+        if name == 'pk':
+            return self.model._meta.pk
+        if name in self.annotations:
+            return self.annotations[name].output_field
+        return self.model._meta.get_field(name)
+
+    def get_position(self, instance):
+        return [getattr(instance, field.lstrip('-'))
+                for field in self.ordering]
+
+    @staticmethod
+    def encode_value(value):
+        if isinstance(value, (datetime.date, datetime.time)):
+            return value.isoformat()
+        return str(value)
+
+    def encode_cursor(self, instance, reverse):
+        cursor = json.dumps(
+            {'p': self.get_position(instance), 'r': reverse},
+            default=self.encode_value
+        )
+        encoded = base64.urlsafe_b64encode(cursor.encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = cursor['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                self.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+            return position, bool(cursor['r'])
+        except (binascii.Error, FieldDoesNotExist, KeyError, TypeError,
+                ValidationError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            url = self.request.build_absolute_uri()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+
+FeedItem = namedtuple('FeedItem', ('created_at', 'recipe_id'))
+
+
+class FeedPagination(KeysetPagination):
+    feed_ordering = ('-created_at', '-recipe_id')
+
+    def paginate_querysets(self, querysets, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = list(self.feed_ordering)
+        self.model = querysets[0].model
+        self.annotations = {}
+        position, _ = self.decode_cursor(request)
+        rows = set()
+        for queryset in querysets:
+            queryset = queryset.order_by(*self.ordering)
+            if position is not None:
+                queryset = queryset.filter(
+                    self.after(position, self.ordering)
+                )
+            rows.update(queryset.values_list(
+                'created_at', 'recipe_id'
+            )[:self.page_size + 1])
+        rows = sorted(rows, reverse=True)
+        self.has_next = len(rows) > self.page_size
+        self.has_previous = False
+        self.page = [FeedItem(*row) for row in rows[:self.page_size]]
+        return [item.recipe_id for item in self.page]
+
+
+class CustomPagination(PageNumberPagination):
+    page_size = 10
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    mode_query_param = 'pagination'
+    keyset_pagination_class = KeysetPagination
+    count_strategy_class = CountStrategy
+
+    def use_keyset(self, request):
+        return (
+            request.query_params.get(self.mode_query_param) == 'cursor'
+            or self.keyset_pagination_class.cursor_query_param
+            in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request):
+            self.keyset = self.keyset_pagination_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.count_strategy = self.count_strategy_class()
+        self.django_paginator_class = partial(
+            CountingPaginator,
+            count_strategy=self.count_strategy
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        response = {
+            'count': self.page.paginator.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data
+        }
+        if self.count_strategy.is_approximate:
+            response['count_is_approximate'] = True
+        return Response(response)
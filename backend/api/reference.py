@@ -0,0 +1,37 @@
+import hashlib
+import json
+
+from django.conf import settings
+from recipes.models import Ingredient, Tag, Unit
+
+from .cache import VersionedIndex
+from .serializers import TagSerializer
+
+
+class ReferenceBundle(VersionedIndex):
+    models = (Ingredient, Tag, Unit)
+
+    def __init__(self):
+        super().__init__()
+        self.snapshot = ('', b'')
+
+    def build(self):
+        content = json.dumps({
+            'tags': TagSerializer(Tag.objects.order_by('id'), many=True).data,
+            'ingredients': [
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for pk, name, unit in Ingredient.objects.order_by(
+                    'id'
+                ).values_list('id', 'name', 'unit__name')
+            ],
+        }, ensure_ascii=False, separators=(',', ':')).encode()
+        digest = hashlib.sha256(content).hexdigest()
+        self.snapshot = (digest[:settings.REFERENCE_BUNDLE_HASH_LENGTH],
+                         content)
+
+    def get(self):
+        self.refresh()
+        return self.snapshot
+
+
+reference_bundle = ReferenceBundle()
@@ -0,0 +1,185 @@
+import bisect
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, Unit,
+                            UserRecipe)
+from rest_framework import mixins
+from rest_framework.response import Response
+
+from .cache import VersionedIndex
+
+PREFIX_END = chr(0x10FFFF)
+WORD_PATTERN = re.compile(r'\w+')
+EXACT_PREFIX, WORD_PREFIX, SUBSTRING, SIMILAR = range(4)
+NGRAM_SIZE = 3
+
+
+class IngredientIndex(VersionedIndex):
+    models = (Ingredient, Unit)
+
+    def __init__(self):
+        super().__init__()
+        self.snapshot = ((), ())
+
+    def build(self):
+        rows = sorted(
+            Ingredient.objects.values_list('id', 'name', 'unit__name'),
+            key=lambda row: (row[1].casefold(), row[0])
+        )
+        self.snapshot = (tuple(row[1].casefold() for row in rows),
+                         tuple(rows))
+
+    @property
+    def rows(self):
+        return self.snapshot[1]
+
+    def search(self, prefix, limit=None):
+        self.refresh()
+        keys, rows = self.snapshot
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + PREFIX_END, start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return rows[start:end]
+
+
+def trigrams(text):
+    grams = set()
+    for word in WORD_PATTERN.findall(text.casefold()):
+        padded = f'  {word} '
+        grams.update(padded[index:index + NGRAM_SIZE]
+                     for index in range(len(padded) - NGRAM_SIZE + 1))
+    return grams
+
+
+def similarity(left, right):
+    if not left or not right:
+        return 0
+    return len(left & right) / len(left | right)
+
+
+def match_tier(key, query):
+    if key.startswith(query):
+        return EXACT_PREFIX
+    if any(word.startswith(query) for word in WORD_PATTERN.findall(key)):
+        return WORD_PREFIX
+    if query in key:
+        return SUBSTRING
+    return SIMILAR
+
+
+class NgramIndex(VersionedIndex):
+    def __init__(self, queryset, usage_field, models):
+        super().__init__()
+        self.queryset = queryset
+        self.usage_field = usage_field
+        self.models = models
+        self.snapshot = ((), {})
+
+    def build(self):
+        rows = []
+        postings = {}
+        for pk, name, usage in self.queryset.values_list(
+            'pk', 'name', self.usage_field
+        ).iterator():
+            grams = trigrams(name)
+            for gram in grams:
+                postings.setdefault(gram, []).append(len(rows))
+            rows.append((pk, name.casefold(), usage, grams))
+        self.snapshot = (tuple(rows), postings)
+
+    def search(self, query):
+        self.refresh()
+        rows, postings = self.snapshot
+        query = query.casefold().strip()
+        query_grams = trigrams(query)
+        if len(query) < NGRAM_SIZE:
+            candidates = {position for position, row in enumerate(rows)
+                          if query in row[1]}
+        else:
+            candidates = {position
+                          for gram in query_grams
+                          for position in postings.get(gram, ())}
+        ranked = []
+        for position in candidates:
+            pk, key, usage, grams = rows[position]
+            tier = match_tier(key, query)
+            if (tier == SIMILAR and similarity(query_grams, grams)
+                    < settings.SEARCH_SIMILARITY_THRESHOLD):
+                continue
+            ranked.append((tier, -usage, pk))
+        return [pk for _, _, pk in sorted(ranked)]
+
+
+ingredient_index = IngredientIndex()
+ingredient_ngram_index = NgramIndex(Ingredient.objects.all(), 'usage_count',
+                                    (Ingredient, RecipeIngredient))
+recipe_ngram_index = NgramIndex(Recipe.objects.all(), 'favorites_count',
+                                (Recipe, UserRecipe))
+
+
+def trigram_search(queryset, query, usage_field):
+    word_prefix = Q(name__iregex=rf'\m{re.escape(query)}')
+    matches = queryset.filter(
+        Q(name__icontains=query) | Q(name__trigram_similar=query)
+    ).annotate(
+        search_tier=Case(
+            When(name__istartswith=query, then=Value(EXACT_PREFIX)),
+            When(word_prefix, then=Value(WORD_PREFIX)),
+            When(name__icontains=query, then=Value(SUBSTRING)),
+            default=Value(SIMILAR),
+            output_field=IntegerField()
+        ),
+    ).order_by('search_tier', f'-{usage_field}', 'pk')
+    return matches.filter(
+        pk__in=matches.values('pk')[:settings.SEARCH_RESULTS_LIMIT]
+    )
+
+
+def ngram_search(queryset, query, index):
+    ids = index.search(query)[:settings.SEARCH_RESULTS_LIMIT]
+    return queryset.filter(pk__in=ids).annotate(search_tier=Case(
+        *[When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ids)],
+        default=Value(len(ids)),
+        output_field=IntegerField()
+    )).order_by('search_tier', 'pk')
+
+
+@lru_cache(maxsize=None)
+def has_trigram_support(alias):
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+def ranked_search(queryset, query, usage_field, index):
+    query = query.strip()
+    if not query:
+        return queryset
+    if has_trigram_support(queryset.db):
+        return trigram_search(queryset, query, usage_field)
+    return ngram_search(queryset, query, index)
+
+
+class IngredientIndexListMixin(mixins.ListModelMixin):
+    index_query_param = 'name'
+
+    def list(self, request, *args, **kwargs):
+        prefix = request.query_params.get(self.index_query_param)
+        if prefix is None or set(request.query_params) - {
+            self.index_query_param
+        }:
+            return super().list(request, *args, **kwargs)
+        return Response([
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit in ingredient_index.search(prefix)
+        ])
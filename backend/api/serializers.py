@@ -1,14 +1,22 @@
+from collections import defaultdict
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.cache import cache
 from django.core.validators import MinValueValidator
+from django.db import transaction
+from django.db.models import Manager
 from recipes.constants import (MAX_LENGTH_EMAIL, MAX_LENGTH_USERNAME,
                                MIN_VALUE_COOKING_TIME)
-from recipes.models import (Follower, Ingredient, Recipe, RecipeIngredient,
-                            Tag, UserRecipe)
+from recipes.models import Follower, Ingredient, Recipe, RecipeIngredient, Tag
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator, ValidationError
 
-from .utils import create_recipe_ingredients, decode_img
+from .cache import recipe_fragment_key
+from .utils import (change_cart_totals, create_recipe_ingredients, decode_img,
+                    get_cart_holders)
 
 User = get_user_model()
 
@@ -47,21 +55,33 @@ class UserSerializer(serializers.ModelSerializer):
         if request and not request.method == 'GET':
             representation.pop('avatar', None)
             return representation
-        try:
-            following = Follower.objects.get(
-                user=request.user,
-                following_user=instance
-            )
-            following_dict = {
-                'is_subscribed': following.is_subscribed
-            }
-        except Exception:
-            following_dict = {
-                'is_subscribed': False
-            }
-        representation.update(following_dict)
+        representation['is_subscribed'] = self.get_is_subscribed(instance)
         return representation
 
+    def get_subscribed_ids(self):
+        subscribed_ids = self.context.get('subscribed_ids')
+        if subscribed_ids is None:
+            request = self.context.get('request')
+            user = getattr(request, 'user', None)
+            if user is None or not user.is_authenticated:
+                subscribed_ids = frozenset()
+            else:
+                subscribed_ids = frozenset(Follower.objects.filter(
+                    user=user,
+                    is_subscribed=True
+                ).values_list('following_user_id', flat=True))
+            self.context['subscribed_ids'] = subscribed_ids
+        return subscribed_ids
+
+    def get_is_subscribed(self, instance):
+        is_subscribed = getattr(instance, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
+        request = self.context.get('request')
+        if getattr(request, 'user', None) == instance:
+            return False
+        return instance.pk in self.get_subscribed_ids()
+
     class Meta:
         model = User
         fields = [
@@ -74,6 +94,14 @@ class UserSerializer(serializers.ModelSerializer):
             'avatar']
 
 
+class UserProfileSerializer(UserSerializer):
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ['recipes_count',
+                                               'followers_count',
+                                               'following_count']
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     measurement_unit = serializers.CharField(source='unit.name')
 
@@ -162,12 +190,16 @@ class RecipePostSerializer(serializers.ModelSerializer):
         ingredients = validated_data.get('recipeingredient_set', [])
         if len(tags) == 0 or len(ingredients) == 0:
             raise ValidationError('Теги и ингредиенты не могут быть пустыми')
-        instance.recipeingredient_set.all().delete()
-        instance.recipetag_set.all().delete()
-        try:
-            create_recipe_ingredients(instance, ingredients, tags)
-        except Exception as e:
-            raise ValidationError(str(e))
+        with transaction.atomic():
+            cart_holders = get_cart_holders(instance)
+            change_cart_totals(cart_holders, [instance.pk], remove=True)
+            instance.recipeingredient_set.all().delete()
+            instance.recipetag_set.all().delete()
+            try:
+                create_recipe_ingredients(instance, ingredients, tags)
+            except Exception as e:
+                raise ValidationError(str(e))
+            change_cart_totals(cart_holders, [instance.pk])
 
         instance.save()
         return instance
@@ -198,34 +230,76 @@ class RecipePostSerializer(serializers.ModelSerializer):
         ]
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.represent(list(recipes))
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(source='recipeingredient_set',
                                              many=True)
     tags = TagSerializer(many=True)
     author = UserSerializer()
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        recipe_dict = {}
+    def to_fragment(self, instance):
+        return super().to_representation(instance)
+
+    def build_fragment(self, instance):
+        return type(self)(context={}).to_fragment(instance)
+
+    def build_absolute_uri(self, path):
         request = self.context.get('request')
-        try:
-            user_recipe = UserRecipe.objects.get(recipe=instance,
-                                                 user=request.user)
-            recipe_dict = {
-                'is_favorited': user_recipe.is_favorite,
-                'is_in_shopping_cart': user_recipe.is_in_shopping_cart,
-            }
-        except Exception:
-            recipe_dict = {
-                'is_favorited': False,
-                'is_in_shopping_cart': False,
+        if not path or request is None:
+            return path
+        return request.build_absolute_uri(path)
+
+    def get_fragments(self, recipes):
+        keys = {recipe.pk: recipe_fragment_key(recipe.pk, recipe.version)
+                for recipe in recipes}
+        fragments = cache.get_many(list(keys.values()))
+        missing = [pk for pk, key in keys.items() if key not in fragments]
+        if missing:
+            loaded = Recipe.objects.filter(pk__in=missing).with_related(
+                AnonymousUser()
+            )
+            built = {keys[recipe.pk]: self.build_fragment(recipe)
+                     for recipe in loaded}
+            cache.set_many(built, settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)
+            fragments.update(built)
+        return [fragments[keys[recipe.pk]] for recipe in recipes]
+
+    def represent(self, recipes):
+        return [
+            {
+                **fragment,
+                'image': self.build_absolute_uri(fragment['image']),
+                'author': {
+                    **fragment['author'],
+                    'avatar': self.build_absolute_uri(
+                        fragment['author']['avatar']
+                    ),
+                    'is_subscribed': getattr(recipe, 'is_author_subscribed',
+                                             False),
+                },
+                'is_favorited': getattr(recipe, 'is_favorited', False),
+                'is_in_shopping_cart': getattr(recipe,
+                                               'is_in_shopping_cart',
+                                               False),
+                'favorites_count': recipe.favorites_count,
+                'in_carts_count': recipe.in_carts_count,
             }
-        representation.update(recipe_dict)
-        return representation
+            for recipe, fragment in zip(recipes, self.get_fragments(recipes))
+        ]
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
 
     class Meta:
         model = Recipe
-        exclude = ('created_at',)
+        exclude = ('created_at', 'updated_at', 'version')
+        list_serializer_class = RecipeListSerializer
 
 
 class RecipeGetSerializer(serializers.ModelSerializer):
@@ -235,6 +309,14 @@ class RecipeGetSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'image', 'cooking_time']
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_LIMIT
+    )
+
+
 class FollowedUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -248,32 +330,53 @@ class FollowedUserSerializer(serializers.ModelSerializer):
         ]
 
 
+class FollowerListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        followers = data.all() if isinstance(data, Manager) else data
+        return self.child.represent(list(followers))
+
+
 class FollowerSerializer(serializers.ModelSerializer):
 
     following_user = FollowedUserSerializer()
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        recipes_limit = self.context.get('recipes_limit')
-        following_user_dict = representation.pop('following_user')
-
-        representation.update(dict(following_user_dict))
+    def get_recipes_limit(self):
+        try:
+            return max(int(self.context.get('recipes_limit')), 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def get_previews(self, followers):
+        limit = self.get_recipes_limit()
+        previews = defaultdict(list)
+        if not limit or not followers:
+            return previews
+        recipes = Recipe.objects.filter(
+            author__in={follower.following_user_id for follower in followers}
+        ).latest_per_author(limit)
+        for recipe in recipes:
+            previews[recipe.author_id].append(recipe)
+        return previews
+
+    def represent(self, followers):
+        previews = self.get_previews(followers)
+        representations = []
+        for follower in followers:
+            representation = super().to_representation(follower)
+            representation.update(representation.pop('following_user'))
+            representation['recipes_count'] = (
+                follower.following_user.recipes_count
+            )
+            representation['recipes'] = RecipeGetSerializer(
+                previews[follower.following_user_id],
+                many=True
+            ).data
+            representations.append(representation)
+        return representations
 
-        following_user = instance.following_user
-        recipes = following_user.recipes.all()
-        recipes_count = recipes.count()
-        representation['recipes_count'] = recipes_count
-        if recipes_limit and recipes_count != 0:
-            try:
-                recipes = recipes[:int(recipes_limit)]
-                representation['recipes'] = RecipeGetSerializer(
-                    recipes,
-                    many=True).data
-                return representation
-            except ValueError as e:
-                return e
-        representation['recipes'] = []
-        return representation
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
 
     class Meta:
         model = Follower
@@ -281,3 +384,4 @@ class FollowerSerializer(serializers.ModelSerializer):
             'following_user',
             'is_subscribed'
         ]
+        list_serializer_class = FollowerListSerializer
@@ -0,0 +1,163 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from recipes.models import (FeedEntry, Follower, Ingredient, PopularRecipe,
+                            Recipe, RecipeIngredient, RecipeTag, ShortUrl, Tag,
+                            Unit, UserRecipe)
+
+from .cache import bump_versions
+from .utils import (USER_RECIPE_FLAGS, backfill_feed, change_cart_totals,
+                    change_ingredient_usage, change_recipe_counters,
+                    change_user_counter, fan_out_recipe, get_cart_holders)
+
+User = get_user_model()
+
+VERSIONED_MODELS = (
+    Follower,
+    Ingredient,
+    PopularRecipe,
+    Recipe,
+    RecipeIngredient,
+    RecipeTag,
+    ShortUrl,
+    Tag,
+    Unit,
+    User,
+    UserRecipe,
+)
+
+
+def bump_model_version(sender, **kwargs):
+    bump_versions(sender)
+
+
+def bump_recipe_version(sender, instance, **kwargs):
+    Recipe.objects.filter(pk=instance.recipe_id).bump_version()
+
+
+def bump_recipes_with_tag(sender, instance, **kwargs):
+    Recipe.objects.filter(tags=instance).bump_version()
+
+
+def bump_recipes_with_ingredient(sender, instance, **kwargs):
+    Recipe.objects.filter(ingredients=instance).bump_version()
+
+
+def bump_recipes_with_unit(sender, instance, **kwargs):
+    Recipe.objects.filter(ingredients__unit=instance).bump_version()
+
+
+def bump_recipes_of_author(sender, instance, created=False, **kwargs):
+    if not created:
+        Recipe.objects.filter(author=instance).bump_version()
+
+
+def remove_recipe_from_carts(sender, instance, **kwargs):
+    change_cart_totals(get_cart_holders(instance), [instance.pk], remove=True)
+
+
+def release_recipe_counters(sender, instance, **kwargs):
+    for field in USER_RECIPE_FLAGS:
+        if getattr(instance, field):
+            change_recipe_counters([instance.recipe_id], field, -1)
+
+
+def fan_out_new_recipe(sender, instance, created=False, **kwargs):
+    if created:
+        transaction.on_commit(partial(fan_out_recipe, instance))
+
+
+def backfill_new_subscription(sender, instance, created=False, **kwargs):
+    if created:
+        backfill_feed(instance.user_id, instance.following_user_id)
+
+
+def clear_cancelled_subscription(sender, instance, **kwargs):
+    FeedEntry.objects.filter(
+        user=instance.user_id,
+        recipe__author=instance.following_user_id
+    ).delete()
+
+
+def count_new_recipe(sender, instance, created=False, **kwargs):
+    if created:
+        change_user_counter([instance.author_id], 'recipes_count', 1)
+
+
+def count_deleted_recipe(sender, instance, **kwargs):
+    change_user_counter([instance.author_id], 'recipes_count', -1)
+
+
+def count_new_subscription(sender, instance, created=False, **kwargs):
+    if created:
+        change_user_counter([instance.user_id], 'following_count', 1)
+        change_user_counter([instance.following_user_id],
+                            'followers_count', 1)
+
+
+def count_cancelled_subscription(sender, instance, **kwargs):
+    change_user_counter([instance.user_id], 'following_count', -1)
+    change_user_counter([instance.following_user_id], 'followers_count', -1)
+
+
+def count_new_ingredient_usage(sender, instance, created=False, **kwargs):
+    if created:
+        change_ingredient_usage([instance.ingredient_id], 1)
+
+
+def count_removed_ingredient_usage(sender, instance, **kwargs):
+    change_ingredient_usage([instance.ingredient_id], -1)
+
+
+USER_COUNTER_RECEIVERS = (
+    (post_save, Recipe, count_new_recipe),
+    (post_delete, Recipe, count_deleted_recipe),
+    (post_save, Follower, count_new_subscription),
+    (post_delete, Follower, count_cancelled_subscription),
+)
+
+
+INGREDIENT_USAGE_RECEIVERS = (
+    (post_save, RecipeIngredient, count_new_ingredient_usage),
+    (post_delete, RecipeIngredient, count_removed_ingredient_usage),
+)
+
+
+FEED_RECEIVERS = (
+    (post_save, Recipe, fan_out_new_recipe),
+    (post_save, Follower, backfill_new_subscription),
+    (post_delete, Follower, clear_cancelled_subscription),
+)
+
+
+RECIPE_VERSION_RECEIVERS = (
+    (post_save, RecipeIngredient, bump_recipe_version),
+    (post_delete, RecipeIngredient, bump_recipe_version),
+    (post_save, RecipeTag, bump_recipe_version),
+    (post_delete, RecipeTag, bump_recipe_version),
+    (post_save, Tag, bump_recipes_with_tag),
+    (post_save, Ingredient, bump_recipes_with_ingredient),
+    (post_save, Unit, bump_recipes_with_unit),
+    (pre_delete, Unit, bump_recipes_with_unit),
+    (post_save, User, bump_recipes_of_author),
+)
+
+
+def connect_signals():
+    for signal, model, receiver in (*RECIPE_VERSION_RECEIVERS,
+                                    *USER_COUNTER_RECEIVERS,
+                                    *INGREDIENT_USAGE_RECEIVERS,
+                                    *FEED_RECEIVERS):
+        signal.connect(receiver, sender=model,
+                       dispatch_uid=f'{receiver.__name__}_{model.__name__}')
+    pre_delete.connect(remove_recipe_from_carts, sender=Recipe,
+                       dispatch_uid='remove_recipe_from_carts')
+    post_delete.connect(release_recipe_counters, sender=UserRecipe,
+                        dispatch_uid='release_recipe_counters')
+    for model in VERSIONED_MODELS:
+        post_save.connect(bump_model_version, sender=model,
+                          dispatch_uid=f'version_save_{model.__name__}')
+        post_delete.connect(bump_model_version, sender=model,
+                            dispatch_uid=f'version_delete_{model.__name__}')
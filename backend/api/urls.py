@@ -4,7 +4,7 @@ from djoser.views import UserViewSet as djoser_UserViewSet
 from rest_framework.routers import DefaultRouter
 
 from .views import (CustomTokenCreateView, IngredientViewSet, RecipesViewSet,
-                    TagViewSet, UserViewSet)
+                    ReferenceBundleView, TagViewSet, UserViewSet)
 
 router = DefaultRouter()
 router.register('users', UserViewSet, basename='users')
@@ -24,5 +24,9 @@ urlpatterns = [
             'post': 'set_password',
         }
     )),
+    path('reference/', ReferenceBundleView.as_view(),
+         name='reference'),
+    path('reference/<str:digest>/', ReferenceBundleView.as_view(),
+         name='reference_bundle'),
     path('', include(router.urls)),
 ]
@@ -1,17 +1,30 @@
 import base64
-import io
-import random
+import csv
+import json
 import string
+import zlib
 
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.base import ContentFile
-from django.http import HttpResponse
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Greatest
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from recipes.constants import MAX_LENGTH_SHORTCODE
-from recipes.models import (Recipe, RecipeIngredient, RecipeTag, ShortUrl,
-                            UserRecipe)
+from recipes.models import (FeedEntry, Follower, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag,
+                            ShoppingCartIngredient, ShortUrl, UserRecipe)
 from rest_framework import status
 from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 
+from .cache import bump_versions, get_versions
+
+User = get_user_model()
+
 
 def decode_img(img_data, user):
     format, imgstr = img_data.split(';base64,')
@@ -36,116 +49,432 @@ def create_recipe_ingredients(recipe, ingredients, tags):
         RecipeTag.objects.bulk_create(
             recipes_tags
         )
+        change_ingredient_usage(
+            [item.ingredient.pk for item in recipes_ingredients], 1
+        )
+        Recipe.objects.filter(pk=recipe.pk).bump_version()
+        bump_versions(RecipeIngredient, RecipeTag)
     except Exception:
         raise
 
 
-def code_generator(
-        size=MAX_LENGTH_SHORTCODE,
-        chars=string.ascii_lowercase + string.digits + string.ascii_uppercase):
-    return ''.join(random.choice(chars) for _ in range(size))
+def change_ingredient_usage(ingredient_ids, delta):
+    Ingredient.objects.filter(pk__in=ingredient_ids).update(
+        usage_count=Greatest(F('usage_count') + delta, 0)
+    )
 
 
-def create_shortcode(size=MAX_LENGTH_SHORTCODE):
-    code = code_generator(size=size)
-    obj = ShortUrl.objects.filter(shortcode=code).exists()
-    if obj:
-        return create_shortcode(size=size)
-    return code
+SHORTCODE_ALPHABET = (string.digits + string.ascii_lowercase
+                      + string.ascii_uppercase)
+SHORTCODE_CHECKSUM_LENGTH = 2
 
 
-def shorten_url(full_url, domain='localhost', secure=False):
-    if secure is False:
-        full_url = 'http://' + full_url
-    else:
-        full_url = 'https://' + full_url
-    try:
-        instance = ShortUrl.objects.get(
-            url=full_url
+def to_base62(number, length=1):
+    digits = []
+    while number or len(digits) < length:
+        number, digit = divmod(number, len(SHORTCODE_ALPHABET))
+        digits.append(SHORTCODE_ALPHABET[digit])
+    return ''.join(reversed(digits))
+
+
+def shortcode_checksum(payload):
+    return to_base62(
+        zlib.crc32(payload.encode())
+        % len(SHORTCODE_ALPHABET) ** SHORTCODE_CHECKSUM_LENGTH,
+        length=SHORTCODE_CHECKSUM_LENGTH
+    )
+
+
+def from_base62(code):
+    number = 0
+    for char in code:
+        number = number * len(SHORTCODE_ALPHABET) + SHORTCODE_ALPHABET.index(
+            char
         )
-        return instance.get_short_url(domain)
-    except ShortUrl.DoesNotExist:
-        instance = None
-    shortcode = create_shortcode()
-    instance = ShortUrl.objects.create(
-        url=full_url,
-        shortcode=shortcode
+    return number
+
+
+def encode_shortcode(recipe_id):
+    payload = to_base62(recipe_id)
+    return payload + shortcode_checksum(payload)
+
+
+def is_valid_shortcode(shortcode):
+    if not set(shortcode) <= set(SHORTCODE_ALPHABET):
+        return False
+    if len(shortcode) == MAX_LENGTH_SHORTCODE:
+        return True
+    payload = shortcode[:-SHORTCODE_CHECKSUM_LENGTH]
+    return (bool(payload) and shortcode_checksum(payload)
+            == shortcode[-SHORTCODE_CHECKSUM_LENGTH:])
+
+
+def get_shortcode_recipe(shortcode):
+    if len(shortcode) == MAX_LENGTH_SHORTCODE:
+        return ShortUrl.objects.filter(
+            shortcode=shortcode
+        ).values_list('recipe', flat=True).first()
+    return Recipe.objects.filter(
+        pk=from_base62(shortcode[:-SHORTCODE_CHECKSUM_LENGTH])
+    ).values_list('pk', flat=True).first()
+
+
+def resolve_shortcode(shortcode):
+    versions = '-'.join(map(str, get_versions(Recipe, ShortUrl)))
+    key = f'shortcode:{shortcode}:{versions}'
+    recipe_id = cache.get(key)
+    if recipe_id is None:
+        recipe_id = get_shortcode_recipe(shortcode) or 0
+        cache.set(key, recipe_id, settings.SHORT_URL_CACHE_TIMEOUT)
+    if not recipe_id:
+        raise Http404
+    return recipe_id
+
+
+def shorten_url(recipe_id, domain='localhost'):
+    return ShortUrl(
+        shortcode=encode_shortcode(recipe_id)
+    ).get_short_url(domain)
+
+
+class Echo:
+
+    def write(self, value):
+        return value
+
+
+def stream_txt(rows):
+    yield 'Ингредиенты:' + '\n'
+    for row in rows:
+        yield f"{row['name']}: {row['amount']} ({row['unit']})\n"
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'unit'))
+    for row in rows:
+        yield writer.writerow((row['name'], row['amount'], row['unit']))
+
+
+def stream_json(rows):
+    yield '['
+    for index, row in enumerate(rows):
+        item = {
+            'name': row['name'],
+            'amount': row['amount'],
+            'unit': row['unit'],
+        }
+        yield (',' if index else '') + json.dumps(item, ensure_ascii=False)
+    yield ']'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': ('text/plain', stream_txt),
+    'csv': ('text/csv', stream_csv),
+    'json': ('application/json', stream_json),
+}
+
+
+def get_cart_totals(user):
+    return ShoppingCartIngredient.objects.filter(
+        user=user
+    ).values(
+        'amount',
+        name=F('ingredient__name'),
+        unit=F('ingredient__unit__name'),
+    ).order_by('name')
+
+
+def change_cart_totals(user_ids, recipe_ids, remove=False):
+    recipe_ingredients = RecipeIngredient.objects.filter(
+        recipe__in=recipe_ids
+    )
+    ingredient_ids = list(
+        recipe_ingredients.values_list('ingredient', flat=True).distinct()
+    )
+    if not user_ids or not ingredient_ids:
+        return
+    if not remove:
+        ShoppingCartIngredient.objects.bulk_create(
+            [ShoppingCartIngredient(user_id=user_id,
+                                    ingredient_id=ingredient_id)
+             for user_id in user_ids
+             for ingredient_id in ingredient_ids],
+            ignore_conflicts=True
+        )
+    recipe_total = Subquery(
+        recipe_ingredients.filter(
+            ingredient=OuterRef('ingredient')
+        ).values('ingredient').annotate(
+            total=Sum('amount')
+        ).values('total')
+    )
+    cart_ingredients = ShoppingCartIngredient.objects.filter(
+        user__in=user_ids,
+        ingredient__in=ingredient_ids
     )
-    return instance.get_short_url(domain)
+    if remove:
+        cart_ingredients.update(
+            amount=Greatest(F('amount') - recipe_total, Value(0))
+        )
+        cart_ingredients.filter(amount=0).delete()
+    else:
+        cart_ingredients.update(amount=F('amount') + recipe_total)
+
 
+def get_cart_holders(recipe):
+    return list(UserRecipe.objects.filter(
+        recipe=recipe,
+        is_in_shopping_cart=True
+    ).values_list('user', flat=True))
 
-def save_recipes_to_text_file(recipes):
 
-    recipe_dict = {}
-    for recipe in recipes:
-        recipes_ingredients = RecipeIngredient.objects.filter(
-            recipe=recipe
+def rebuild_cart_totals(user_ids):
+    if not user_ids:
+        return
+    totals = RecipeIngredient.objects.filter(
+        recipe__userrecipe__user__in=user_ids,
+        recipe__userrecipe__is_in_shopping_cart=True
+    ).values(
+        'ingredient',
+        user=F('recipe__userrecipe__user'),
+    ).annotate(total=Sum('amount')).order_by()
+    with transaction.atomic():
+        ShoppingCartIngredient.objects.filter(user__in=user_ids).delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            [ShoppingCartIngredient(user_id=row['user'],
+                                    ingredient_id=row['ingredient'],
+                                    amount=row['total'])
+             for row in totals.iterator()],
+            batch_size=1000
         )
-        for recipe_ing in recipes_ingredients:
-            ing = recipe_ing.ingredient
-            if ing.name in recipe_dict.keys():
-                recipe_dict[ing.name]['amount'] += recipe_ing.amount
-            else:
-                recipe_dict[ing.name] = {
-                    'amount': recipe_ing.amount,
-                    'unit': ing.unit.name
-                }
-    output = io.StringIO(newline='\n')
-    output.write('Ингредиенты:' + '\n')
-    for ing_name, data in recipe_dict.items():
-        output.write(f"{ing_name}: {data['amount']} ({data['unit']})\n")
-
-    output.seek(0)
-
-    response = HttpResponse(output.read(), content_type='text/plain')
-    response['Content-Disposition'] = 'attachment; filename=recipes.txt'
 
+
+def stream_shopping_list(rows, export_format='txt'):
+    content_type, stream = SHOPPING_LIST_FORMATS[export_format]
+    rows = rows.iterator(chunk_size=settings.SHOPPING_LIST_CHUNK_SIZE)
+    response = StreamingHttpResponse(
+        (chunk.encode() for chunk in stream(rows)),
+        content_type=f'{content_type}; charset=utf-8'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename=recipes.{export_format}'
+    )
     return response
 
 
 def favorite_recipe_shopping_cart(request, pk, is_favorite=False,
                                   is_shopping_cart=False):
-    from api.serializers import RecipeGetSerializer
     recipe = get_object_or_404(
         Recipe,
         pk=pk
     )
     try:
-        user = request.user
-        user_recipe, created = UserRecipe.objects.get_or_create(
-            recipe=recipe,
-            user=user,
-        )
-        if is_favorite:
-            field = user_recipe.is_favorite
-            attibute = 'is_favorite'
-            err_no_obj = 'Рецепт не находится в ваших избранных'
-            err_already_obj = 'Рецепт уже находится в избранных'
-        else:
-            field = user_recipe.is_in_shopping_cart
-            attibute = 'is_in_shopping_cart'
-            err_no_obj = 'Рецепт не находится в вашей корзине'
-            err_already_obj = 'Рецепт уже находится в корзине'
-        if request.method == 'DELETE':
-            if field is True:
-                setattr(user_recipe,
-                        attibute,
-                        False)
-                user_recipe.save()
-                return Response(
-                    status=status.HTTP_204_NO_CONTENT
-                )
-            raise Exception(err_no_obj)
-        if field is True:
-            raise Exception(err_already_obj)
-        setattr(user_recipe, attibute, True)
-        user_recipe.save()
-        obj = RecipeGetSerializer(recipe).data
-        return Response(
-            obj,
-            status=status.HTTP_201_CREATED
-        )
+        with transaction.atomic():
+            return toggle_user_recipe(request, recipe, is_favorite)
     except Exception as e:
         return Response({
             'errors': str(e),
         }, status=status.HTTP_400_BAD_REQUEST)
+
+
+USER_RECIPE_FLAGS = ('is_favorite', 'is_in_shopping_cart')
+USER_RECIPE_TIMESTAMPS = {
+    'is_favorite': 'favorited_at',
+    'is_in_shopping_cart': 'added_to_cart_at',
+}
+RECIPE_COUNTERS = {
+    'is_favorite': 'favorites_count',
+    'is_in_shopping_cart': 'in_carts_count',
+}
+BULK_STATUSES = {
+    True: ('added', 'already_added'),
+    False: ('removed', 'not_added'),
+}
+
+
+def change_recipe_counters(recipe_ids, field, delta):
+    counter = RECIPE_COUNTERS[field]
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        **{counter: Greatest(F(counter) + delta, 0)}
+    )
+
+
+def change_user_counter(user_ids, counter, delta):
+    User.objects.filter(pk__in=user_ids).update(
+        **{counter: Greatest(F(counter) + delta, 0)}
+    )
+
+
+def set_user_recipe_flag(user, recipe_ids, field, value):
+    if field not in USER_RECIPE_FLAGS:
+        raise ValueError(f'Неизвестный флаг: {field}')
+    if not recipe_ids:
+        return set()
+    quote = connection.ops.quote_name
+    table = quote(UserRecipe._meta.db_table)
+    column = quote(field)
+    stamp = quote(USER_RECIPE_TIMESTAMPS[field])
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        if value:
+            values = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(recipe_ids))
+            params = []
+            for recipe_id in recipe_ids:
+                params += [user.pk, recipe_id,
+                           field == 'is_favorite',
+                           field == 'is_in_shopping_cart',
+                           now if field == 'is_favorite' else None,
+                           now if field == 'is_in_shopping_cart' else None]
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, recipe_id, is_favorite, '
+                f'is_in_shopping_cart, favorited_at, added_to_cart_at) '
+                f'VALUES {values} '
+                f'ON CONFLICT (user_id, recipe_id) DO UPDATE '
+                f'SET {column} = TRUE, {stamp} = %s '
+                f'WHERE {table}.{column} = FALSE '
+                f'RETURNING recipe_id',
+                [*params, now]
+            )
+        else:
+            placeholders = ', '.join(['%s'] * len(recipe_ids))
+            cursor.execute(
+                f'UPDATE {table} SET {column} = FALSE, {stamp} = NULL '
+                f'WHERE user_id = %s AND recipe_id IN ({placeholders}) '
+                f'AND {column} = TRUE RETURNING recipe_id',
+                [user.pk, *recipe_ids]
+            )
+        changed = {row[0] for row in cursor.fetchall()}
+    if changed:
+        change_recipe_counters(changed, field, 1 if value else -1)
+        bump_versions(UserRecipe)
+        if not value:
+            UserRecipe.objects.filter(
+                user=user,
+                recipe__in=changed,
+                is_favorite=False,
+                is_in_shopping_cart=False
+            ).delete()
+    return changed
+
+
+def toggle_user_recipe(request, recipe, is_favorite):
+    from api.serializers import RecipeGetSerializer
+    user = request.user
+    if is_favorite:
+        field = 'is_favorite'
+        err_no_obj = 'Рецепт не находится в ваших избранных'
+        err_already_obj = 'Рецепт уже находится в избранных'
+    else:
+        field = 'is_in_shopping_cart'
+        err_no_obj = 'Рецепт не находится в вашей корзине'
+        err_already_obj = 'Рецепт уже находится в корзине'
+    if request.method == 'DELETE':
+        if not set_user_recipe_flag(user, [recipe.pk], field, False):
+            raise Exception(err_no_obj)
+        if not is_favorite:
+            change_cart_totals([user.pk], [recipe.pk], remove=True)
+        return Response(
+            status=status.HTTP_204_NO_CONTENT
+        )
+    if not set_user_recipe_flag(user, [recipe.pk], field, True):
+        raise Exception(err_already_obj)
+    if not is_favorite:
+        change_cart_totals([user.pk], [recipe.pk])
+    obj = RecipeGetSerializer(recipe).data
+    return Response(
+        obj,
+        status=status.HTTP_201_CREATED
+    )
+
+
+def bulk_favorite_recipe_shopping_cart(request, is_favorite=False):
+    from api.serializers import RecipeIdsSerializer
+    serializer = RecipeIdsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+    existing = set(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list('pk', flat=True)
+    )
+    found = [pk for pk in recipe_ids if pk in existing]
+    field = 'is_favorite' if is_favorite else 'is_in_shopping_cart'
+    value = request.method != 'DELETE'
+    with transaction.atomic():
+        changed = set_user_recipe_flag(request.user, found, field, value)
+        if changed and not is_favorite:
+            change_cart_totals([request.user.pk], list(changed),
+                               remove=not value)
+    done, skipped = BULK_STATUSES[value]
+    return Response({
+        'results': [
+            {
+                'id': pk,
+                'status': (done if pk in changed
+                           else skipped if pk in existing
+                           else 'not_found')
+            }
+            for pk in recipe_ids
+        ]
+    }, status=status.HTTP_200_OK)
+
+
+def get_high_follower_authors(user):
+    return list(Follower.objects.filter(
+        user=user,
+        following_user__followers_count__gt=(
+            settings.FEED_FANOUT_FOLLOWER_LIMIT
+        )
+    ).values_list('following_user', flat=True))
+
+
+def is_high_follower_author(author_id):
+    return User.objects.filter(
+        pk=author_id,
+        followers_count__gt=settings.FEED_FANOUT_FOLLOWER_LIMIT
+    ).exists()
+
+
+def fan_out_recipe(recipe):
+    if is_high_follower_author(recipe.author_id):
+        return 0
+    batch_size = settings.FEED_FANOUT_BATCH_SIZE
+    follower_ids = Follower.objects.filter(
+        following_user=recipe.author_id
+    ).values_list('user_id', flat=True)
+    created = 0
+    batch = []
+    for user_id in follower_ids.iterator(chunk_size=batch_size):
+        batch.append(FeedEntry(user_id=user_id,
+                               recipe_id=recipe.pk,
+                               created_at=recipe.created_at))
+        if len(batch) == batch_size:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        created += len(batch)
+    return created
+
+
+def backfill_feed(user_id, author_id):
+    if is_high_follower_author(author_id):
+        return
+    recipes = Recipe.objects.filter(author=author_id).order_by(
+        '-created_at', '-pk'
+    ).values_list('pk', 'created_at')[:settings.FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user_id, recipe_id=pk, created_at=created_at)
+         for pk, created_at in recipes],
+        ignore_conflicts=True
+    )
+
+
+def get_feed_querysets(user):
+    querysets = [FeedEntry.objects.filter(user=user)]
+    authors = get_high_follower_authors(user)
+    if authors:
+        querysets.append(Recipe.objects.filter(author__in=authors).annotate(
+            recipe_id=F('pk')
+        ))
+    return querysets
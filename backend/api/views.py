@@ -1,24 +1,42 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
-from django.http import HttpResponseRedirect
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import (Http404, HttpResponse, HttpResponseNotModified,
+                         HttpResponseRedirect)
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 from django.views import View
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import TokenCreateView
-from recipes.models import Follower, Ingredient, Recipe, ShortUrl, Tag
+from recipes.models import (Follower, Ingredient, PopularRecipe, Recipe,
+                            RecipeIngredient, RecipeTag, Tag, Unit, UserRecipe)
 from rest_framework import mixins, status, viewsets
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import OrderingFilter
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
+from .cache import (AnonymousCacheMixin, ConditionalGetMixin, get_versions,
+                    make_etag, versions_last_modified)
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .negotiation import IgnoreFormatContentNegotiation
+from .pagination import CustomPagination, FeedPagination
 from .permissions import IsAuthenticatedAuthorSuperuserOrReadOnly
+from .reference import reference_bundle
+from .search import IngredientIndexListMixin
 from .serializers import (FollowerSerializer, IngredientSerializer,
                           RecipePostSerializer, RecipeSerializer,
-                          TagSerializer, UserSerializer)
-from .utils import (decode_img, favorite_recipe_shopping_cart,
-                    save_recipes_to_text_file, shorten_url)
+                          TagSerializer, UserProfileSerializer)
+from .utils import (RECIPE_COUNTERS, SHOPPING_LIST_FORMATS,
+                    bulk_favorite_recipe_shopping_cart, decode_img,
+                    favorite_recipe_shopping_cart, get_cart_totals,
+                    get_feed_querysets, is_valid_shortcode, resolve_shortcode,
+                    shorten_url, stream_shopping_list)
 
 User = get_user_model()
 
@@ -44,9 +62,20 @@ class CustomTokenCreateView(TokenCreateView,):
 class UserViewSet(viewsets.ModelViewSet):
 
     queryset = User.objects.all()
-    serializer_class = UserSerializer
+    serializer_class = UserProfileSerializer
     pagination_class = CustomPagination
     permission_classes = [AllowAny]
+    cursor_ordering = ('id',)
+
+    def get_queryset(self):
+        user = self.request.user
+        if not user.is_authenticated:
+            return User.objects.order_by('id')
+        return User.objects.annotate(is_subscribed=Exists(
+            Follower.objects.filter(user=user,
+                                    following_user=OuterRef('pk'),
+                                    is_subscribed=True)
+        )).order_by('id')
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -82,7 +111,7 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def me(self, request):
-        user = UserSerializer(request.user, context={
+        user = UserProfileSerializer(request.user, context={
             'request': request
         }).data
         return Response(user, status=status.HTTP_200_OK)
@@ -94,7 +123,9 @@ class UserViewSet(viewsets.ModelViewSet):
     )
     def get_subscriptions(self, request):
         recipes_limit = request.query_params.get('recipes_limit', None)
-        queryset = request.user.following.all()
+        queryset = request.user.following.select_related(
+            'following_user'
+        ).order_by('-id')
         page = self.paginate_queryset(queryset)
         serializer = FollowerSerializer(
             page,
@@ -118,13 +149,12 @@ class UserViewSet(viewsets.ModelViewSet):
             pk=pk,
         )
         if request.method == 'DELETE':
-            try:
-                delete_sub = Follower.objects.get(
+            with transaction.atomic():
+                deleted, _ = Follower.objects.filter(
                     user=user,
                     following_user=following_user
-                )
-                delete_sub.delete()
-            except Exception:
+                ).delete()
+            if not deleted:
                 return Response(
                     status=status.HTTP_400_BAD_REQUEST
                 )
@@ -132,17 +162,15 @@ class UserViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_204_NO_CONTENT
             )
 
-        instance = Follower.objects.filter(
-            user=user,
-            following_user=following_user
-        ).exists()
-        if user != following_user and not instance:
-            object = Follower.objects.create(
-                user=user,
-                following_user=following_user,
-                is_subscribed=True
-            )
-
+        created = False
+        if user != following_user:
+            with transaction.atomic():
+                object, created = Follower.objects.get_or_create(
+                    user=user,
+                    following_user=following_user,
+                    defaults={'is_subscribed': True}
+                )
+        if created:
             serializer = FollowerSerializer(
                 object,
                 context={'recipes_limit': recipes_limit}
@@ -156,12 +184,90 @@ class UserViewSet(viewsets.ModelViewSet):
             status=status.HTTP_400_BAD_REQUEST)
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(ConditionalGetMixin,
+                     AnonymousCacheMixin,
+                     viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
+    cache_models = (Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag,
+                    Unit, User)
+    conditional_actions = ('retrieve',)
     pagination_class = CustomPagination
     permission_classes = [IsAuthenticatedAuthorSuperuserOrReadOnly, ]
-    filter_backends = [DjangoFilterBackend]
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = RecipeFilter
+    ordering_fields = ('created_at', 'favorites_count', 'in_carts_count')
+
+    def get_queryset(self):
+        return Recipe.objects.with_user_flags(self.request.user)
+
+    def get_anonymous_cache_key(self, request):
+        key = super().get_anonymous_cache_key(request)
+        ordering = request.query_params.get('ordering', '')
+        if request.query_params.get('search') or any(
+            counter in ordering for counter in RECIPE_COUNTERS.values()
+        ):
+            key = f'{key}:{get_versions(UserRecipe)[0]}'
+        return key
+
+    @staticmethod
+    def get_cached_recipes(data):
+        return data['results'] if 'results' in data else [data]
+
+    def to_cached_data(self, data):
+        recipes = [
+            {field: value for field, value in recipe.items()
+             if field not in RECIPE_COUNTERS.values()}
+            for recipe in self.get_cached_recipes(data)
+        ]
+        if 'results' in data:
+            return {**data, 'results': recipes}
+        return recipes[0]
+
+    def from_cached_data(self, data):
+        recipes = self.get_cached_recipes(data)
+        counters = {
+            row.pop('pk'): row
+            for row in Recipe.objects.filter(
+                pk__in=[recipe['id'] for recipe in recipes]
+            ).values('pk', *RECIPE_COUNTERS.values())
+        }
+        for recipe in recipes:
+            recipe.update(counters.get(recipe['id'], {}))
+        return data
+
+    def get_recipe_marker(self, pk):
+        if not hasattr(self, '_recipe_marker'):
+            try:
+                self._recipe_marker = self.get_queryset().filter(
+                    pk=pk
+                ).values_list(
+                    'version',
+                    'updated_at',
+                    'is_favorited',
+                    'is_in_shopping_cart',
+                    'is_author_subscribed',
+                    'favorites_count',
+                    'in_carts_count',
+                ).first()
+            except (TypeError, ValueError):
+                self._recipe_marker = None
+        return self._recipe_marker
+
+    def get_etag(self, request, pk=None):
+        marker = self.get_recipe_marker(pk)
+        if marker is None:
+            return None
+        return make_etag(request.path, *marker)
+
+    def get_last_modified(self, request, pk=None):
+        marker = self.get_recipe_marker(pk)
+        if marker is None:
+            return None
+        last_modified = marker[1]
+        if request.user.is_authenticated:
+            user_state = versions_last_modified(UserRecipe, Follower)
+            last_modified = max(last_modified, user_state)
+        return last_modified
 
     @action(
         methods=['POST', 'DELETE'],
@@ -173,6 +279,15 @@ class RecipesViewSet(viewsets.ModelViewSet):
                                              pk,
                                              is_favorite=True)
 
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='favorite/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_recipes_bulk(self, request):
+        return bulk_favorite_recipe_shopping_cart(request, is_favorite=True)
+
     @action(
         methods=['GET'],
         url_path='get-link',
@@ -180,17 +295,11 @@ class RecipesViewSet(viewsets.ModelViewSet):
     )
     def get_short_link(self, request, pk):
         try:
-            get_object_or_404(
+            recipe = get_object_or_404(
                 Recipe,
                 pk=pk
             )
-            domain = request.get_host()
-            path = request.path
-            segments = path.strip('/').split('/')
-            path = '/'.join(segments[:-1])
-            short_url = shorten_url(f'{domain}/{path}',
-                                    domain,
-                                    secure=request.is_secure())
+            short_url = shorten_url(recipe.pk, request.get_host())
             return Response({
                 'short-link': short_url
             }, status=status.HTTP_200_OK)
@@ -205,14 +314,18 @@ class RecipesViewSet(viewsets.ModelViewSet):
         detail=False,
         url_path='download_shopping_cart',
         permission_classes=[IsAuthenticated],
+        renderer_classes=[JSONRenderer],
+        content_negotiation_class=IgnoreFormatContentNegotiation,
     )
     def get_shopping_cart_file(self, request):
-        return save_recipes_to_text_file(
-            Recipe.objects.filter(
-                userrecipe__user=request.user,
-                userrecipe__is_in_shopping_cart=True,
-            )
-        )
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in SHOPPING_LIST_FORMATS:
+            raise ValidationError({'format': (
+                'Допустимые форматы: '
+                f'{", ".join(SHOPPING_LIST_FORMATS)}'
+            )})
+        return stream_shopping_list(get_cart_totals(request.user),
+                                    export_format)
 
     @action(
         methods=['POST', 'DELETE'],
@@ -224,6 +337,59 @@ class RecipesViewSet(viewsets.ModelViewSet):
                                              pk,
                                              is_shopping_cart=True)
 
+    @action(
+        methods=['POST', 'DELETE'],
+        detail=False,
+        url_path='shopping_cart/bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def recipes_shopping_cart_bulk(self, request):
+        return bulk_favorite_recipe_shopping_cart(request)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='feed',
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        paginator = FeedPagination()
+        recipe_ids = paginator.paginate_querysets(
+            get_feed_querysets(request.user), request
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['GET'],
+        detail=False,
+        url_path='popular',
+    )
+    def popular(self, request):
+        period = request.query_params.get('period', PopularRecipe.WEEK)
+        if period not in dict(PopularRecipe.PERIOD_CHOICES):
+            raise ValidationError({'period': 'Неизвестный период'})
+        entries = PopularRecipe.objects.filter(period=period).order_by('rank')
+        tag = request.query_params.get('tag')
+        if tag:
+            entries = entries.filter(tag__slug=tag)
+        else:
+            entries = entries.filter(tag__isnull=True)
+        page = self.paginate_queryset(entries)
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in page]
+        )
+        serializer = self.get_serializer(
+            [recipes[entry.recipe_id] for entry in page
+             if entry.recipe_id in recipes],
+            many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PATCH']:
             return RecipePostSerializer
@@ -234,26 +400,60 @@ class RecipesViewSet(viewsets.ModelViewSet):
         serializer.save(author=user)
 
 
-class TagViewSet(viewsets.GenericViewSet,
+class TagViewSet(ConditionalGetMixin,
+                 AnonymousCacheMixin,
+                 viewsets.GenericViewSet,
                  mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,):
     queryset = Tag.objects.all()
+    cache_models = (Tag,)
     serializer_class = TagSerializer
 
 
-class IngredientViewSet(viewsets.GenericViewSet,
-                        mixins.ListModelMixin,
+class IngredientViewSet(ConditionalGetMixin,
+                        AnonymousCacheMixin,
+                        viewsets.GenericViewSet,
+                        IngredientIndexListMixin,
                         mixins.RetrieveModelMixin,):
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
-    queryset = Ingredient.objects.all()
+
+    @property
+    def cache_models(self):
+        if self.request.query_params.get('search'):
+            return (Ingredient, Unit, RecipeIngredient)
+        return (Ingredient, Unit)
+    queryset = Ingredient.objects.select_related('unit')
     serializer_class = IngredientSerializer
 
 
+class ReferenceBundleView(View):
+    def get(self, request, digest=None):
+        current, content = reference_bundle.get()
+        if digest != current:
+            response = HttpResponseRedirect(
+                reverse('api:reference_bundle', args=(current,))
+            )
+            patch_cache_control(response, no_cache=True)
+            return response
+        etag = f'"{current}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content,
+                                    content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response,
+                            public=True,
+                            max_age=settings.REFERENCE_BUNDLE_MAX_AGE,
+                            immutable=True)
+        return response
+
+
 class URLRedirectView(View):
     def get(self, request, shortcode=None, *args, **kwargs):
-        try:
-            instance = ShortUrl.objects.get(shortcode__iexact=shortcode)
-            return HttpResponseRedirect(instance.url)
-        except ShortUrl.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
+        if not is_valid_shortcode(shortcode):
+            raise Http404
+        return HttpResponseRedirect(request.build_absolute_uri(
+            reverse('api:recipes-detail', args=(resolve_shortcode(shortcode),))
+        ))
@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework.authtoken',
     'rest_framework',
     'djoser',
@@ -71,6 +72,57 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+PAGINATION_COUNT_CACHE_TIMEOUT = 30
+
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 100000
+
+ANONYMOUS_CACHE_TIMEOUT = 60 * 15
+
+RECIPE_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+SHOPPING_LIST_CHUNK_SIZE = 2000
+
+VERSION_CHECK_INTERVAL = 1
+
+SEARCH_SIMILARITY_THRESHOLD = 0.3
+
+SEARCH_RESULTS_LIMIT = 1000
+
+REFERENCE_BUNDLE_HASH_LENGTH = 16
+
+REFERENCE_BUNDLE_MAX_AGE = 60 * 60 * 24 * 365
+
+SHORT_URL_CACHE_TIMEOUT = 60 * 60 * 24
+
+BULK_RECIPES_LIMIT = 100
+
+FEED_FANOUT_BATCH_SIZE = 1000
+
+FEED_FANOUT_FOLLOWER_LIMIT = 10000
+
+FEED_BACKFILL_SIZE = 20
+
+LEADERBOARD_SIZE = 100
+
+LEADERBOARD_FAVORITE_WEIGHT = 1.0
+
+LEADERBOARD_CART_WEIGHT = 0.5
+
+LEADERBOARD_PERIODS = {
+    'week': {'window_days': 7, 'half_life_days': 2},
+    'all': {'window_days': None, 'half_life_days': 90},
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
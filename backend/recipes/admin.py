@@ -1,9 +1,8 @@
+from api.utils import get_cart_holders, rebuild_cart_totals
 from django.contrib import admin
 from django.contrib.auth import get_user_model
-from django.db.models import Count, OuterRef, Subquery
 
-from .models import (Follower, Ingredient, Recipe, RecipeIngredient, Tag, Unit,
-                     UserRecipe)
+from .models import Follower, Ingredient, Recipe, RecipeIngredient, Tag, Unit
 
 admin.site.empty_value_display = 'Не задано'
 
@@ -81,20 +80,13 @@ class RecipeIngredientInline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     inlines = [RecipeIngredientInline]
-    list_display = ('name', 'author', 'is_favorite_count')
+    list_display = ('name', 'author', 'favorites_count', 'in_carts_count')
     search_fields = ('name', 'author__username')
     list_filter = (
         'tags__name',
     )
 
-    def is_favorite_count(self, obj):
-        return obj.is_favorite_count
-
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        queryset = queryset.annotate(
-            is_favorite_count=Count(Subquery(UserRecipe.objects.filter(
-                recipe=OuterRef('id'), is_favorite=True).values('recipe'))
-            )
-        )
-        return queryset
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            rebuild_cart_totals(get_cart_holders(form.instance))
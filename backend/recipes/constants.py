@@ -7,3 +7,4 @@ MAX_LENGTH_SLUG = 50
 MIN_VALUE_COOKING_TIME = 1
 MAX_LENGTH_URL = 256
 MAX_LENGTH_SHORTCODE = 15
+MAX_LENGTH_PERIOD = 10
@@ -0,0 +1,307 @@
+import json
+import math
+import platform
+import re
+import statistics
+import time
+import tracemalloc
+from collections import Counter, namedtuple
+from urllib.parse import parse_qs, urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from recipes.models import Follower, Ingredient, Recipe, Tag, UserRecipe
+from rest_framework.authtoken.models import Token
+
+from .benchmark_shopping_list import QueryCounter
+
+User = get_user_model()
+
+COLLECTION_PATH = (settings.BASE_DIR.parent / 'postman_collection'
+                   / 'foodgram.postman_collection.json')
+VARIABLE = re.compile(r'{{(\w+)}}')
+STATUS = re.compile(r'\b[1-5]\d\d\b')
+PERCENTILES = (50, 95, 99)
+ORDINALS = ('first', 'second', 'third', 'fourth', 'fifth')
+USER_ORDINALS = ('user', 'secondUser', 'thirdUser')
+
+Scenario = namedtuple('Scenario', 'name url token')
+
+
+def percentile(values, rank):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+def iter_requests(items, auth=None):
+    for item in items:
+        item_auth = item.get('auth') or auth
+        if 'item' in item:
+            yield from iter_requests(item['item'], item_auth)
+            continue
+        request = item['request']
+        script = ' '.join(
+            line for event in item.get('event', ())
+            if event['listen'] == 'test'
+            for line in event['script']['exec']
+        )
+        yield item['name'], request, request.get('auth') or item_auth, script
+
+
+def load_scenarios(path):
+    with open(path, encoding='utf-8') as file:
+        collection = json.load(file)
+    scenarios = []
+    seen = set()
+    names = Counter()
+    for name, request, auth, script in iter_requests(
+        collection['item'], collection.get('auth')
+    ):
+        if request['method'] != 'GET' or set(STATUS.findall(script)) != {
+            '200'
+        }:
+            continue
+        url = request['url']
+        url = url['raw'] if isinstance(url, dict) else url
+        url = url.replace('{{baseUrl}}', '')
+        token = None
+        if auth and auth['type'] == 'apikey':
+            values = {value['key']: value['value'] for value in auth['apikey']}
+            token = VARIABLE.search(values['value']).group(1)
+        if (url, token) in seen:
+            continue
+        seen.add((url, token))
+        name = re.sub(r'\W+', '_', name).strip('_').lower()
+        names[name] += 1
+        if names[name] > 1:
+            name = f'{name}_{names[name]}'
+        scenarios.append(Scenario(name, url, token))
+    return scenarios
+
+
+class Command(BaseCommand):
+    help = ('Воспроизводит GET-сценарии postman_collection внутри процесса '
+            'и выводит JSON с задержками p50/p95/p99, количеством запросов '
+            'к базе и памятью по каждому сценарию. Данные для нагрузки '
+            'создаёт generate_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collection', default=str(COLLECTION_PATH),
+                            help='Путь к postman-коллекции.')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Количество замеров каждого сценария.')
+        parser.add_argument('--warmup', type=int, default=1,
+                            help='Количество прогревочных запросов.')
+        parser.add_argument('--memory-repeat', type=int, default=3,
+                            help='Количество замеров памяти.')
+        parser.add_argument('--cold', action='store_true',
+                            help='Очищать кеш перед каждым запросом.')
+        parser.add_argument('--scenario', nargs='*', default=(),
+                            help='Запускать только сценарии с этими '
+                                 'подстроками в названии.')
+        parser.add_argument('--user', help='Пользователь, от имени которого '
+                                           'выполняются запросы.')
+        parser.add_argument('--output', help='Файл для JSON-отчёта.')
+        parser.add_argument('--compare', help='JSON-отчёт для сравнения.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимый рост p95 при сравнении.')
+
+    def get_users(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f'Пользователь {username} не найден')
+        else:
+            active = UserRecipe.objects.filter(
+                is_in_shopping_cart=True
+            ).values('user').annotate(
+                recipes=Count('pk')
+            ).order_by('-recipes').first()
+            user = (User.objects.get(pk=active['user']) if active
+                    else User.objects.order_by('pk').first())
+        if user is None:
+            raise CommandError('Нет данных, сначала выполните generate_data')
+        followed = Follower.objects.filter(user=user).order_by(
+            '-following_user__followers_count'
+        ).values_list('following_user', flat=True)
+        authors = list(User.objects.filter(pk__in=list(followed[:2])))
+        authors += list(User.objects.exclude(
+            pk__in=[user.pk, *[author.pk for author in authors]]
+        ).order_by('-followers_count')[:2 - len(authors)])
+        return [user, *authors]
+
+    def get_variables(self, options):
+        variables = {}
+        for ordinal, user in zip(USER_ORDINALS,
+                                 self.get_users(options['user'])):
+            variables[f'{ordinal}Id'] = user.pk
+            variables[f'{ordinal}Token'] = Token.objects.get_or_create(
+                user=user
+            )[0].key
+        recipes = Recipe.objects.order_by('-favorites_count', 'pk')
+        tags = Tag.objects.order_by('pk')
+        for ordinal, recipe in zip(ORDINALS, recipes):
+            variables[f'{ordinal}RecipeId'] = recipe.pk
+        for ordinal, tag in zip(ORDINALS, tags):
+            variables[f'{ordinal}TagId'] = tag.pk
+            variables[f'{ordinal}TagSlug'] = tag.slug
+        ingredient = Ingredient.objects.order_by('-usage_count', 'pk').first()
+        if ingredient is not None:
+            variables['firstIngredientId'] = ingredient.pk
+            variables['firstIndredientId'] = ingredient.pk
+            variables['ingredientNameFirstLatter'] = ingredient.name[0]
+        return variables
+
+    def request(self, client, path, params):
+        if self.cold:
+            cache.clear()
+        response = client.get(path, params)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def measure(self, scenario, variables, options):
+        missing = {*VARIABLE.findall(scenario.url),
+                   *filter(None, [scenario.token])} - variables.keys()
+        if missing:
+            return None, f'нет переменных: {", ".join(sorted(missing))}'
+        url = VARIABLE.sub(lambda match: str(variables[match.group(1)]),
+                           scenario.url)
+        parts = urlsplit(url)
+        params = parse_qs(parts.query)
+        client = Client(**({
+            'HTTP_AUTHORIZATION': f'Token {variables[scenario.token]}'
+        } if scenario.token else {}))
+        for _ in range(options['warmup']):
+            self.request(client, parts.path, params)
+        latencies = []
+        queries = []
+        statuses = Counter()
+        for _ in range(options['repeat']):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = self.request(client, parts.path, params)
+                latencies.append((time.perf_counter() - started) * 1000)
+            queries.append(counter.count)
+            statuses[response.status_code] += 1
+        peaks = []
+        retained = []
+        tracemalloc.start()
+        try:
+            for _ in range(options['memory_repeat']):
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                self.request(client, parts.path, params)
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append((peak - before) / 1024)
+                retained.append((current - before) / 1024)
+        finally:
+            tracemalloc.stop()
+        result = {
+            'url': url,
+            'authenticated': scenario.token is not None,
+            'status': {str(code): count for code, count in statuses.items()},
+            'latency_ms': {
+                f'p{rank}': round(percentile(latencies, rank), 3)
+                for rank in PERCENTILES
+            },
+            'queries': {
+                'p50': percentile(queries, 50),
+                'max': max(queries),
+            },
+        }
+        result['latency_ms']['mean'] = round(statistics.mean(latencies), 3)
+        if peaks:
+            result['memory_kb'] = {
+                'peak': round(statistics.median(peaks), 1),
+                'retained': round(statistics.median(retained), 1),
+            }
+        return result, None
+
+    def get_dataset(self):
+        return {
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'ingredients': Ingredient.objects.count(),
+            'follows': Follower.objects.count(),
+            'favorites': UserRecipe.objects.filter(is_favorite=True).count(),
+            'carts': UserRecipe.objects.filter(
+                is_in_shopping_cart=True
+            ).count(),
+        }
+
+    def compare(self, report, path, threshold):
+        with open(path, encoding='utf-8') as file:
+            baseline = json.load(file)['scenarios']
+        regressions = []
+        for name, result in report['scenarios'].items():
+            previous = baseline.get(name)
+            if previous is None:
+                continue
+            before = previous['latency_ms']['p95']
+            after = result['latency_ms']['p95']
+            if after > before * (1 + threshold):
+                regressions.append(f'{name}: p95 {before} -> {after} мс')
+            before = previous['queries']['p50']
+            after = result['queries']['p50']
+            if after > before:
+                regressions.append(f'{name}: запросов {before} -> {after}')
+        return regressions
+
+    def handle(self, *args, **options):
+        if options['repeat'] <= 0:
+            raise CommandError('--repeat должен быть положительным')
+        try:
+            scenarios = load_scenarios(options['collection'])
+        except FileNotFoundError:
+            raise CommandError(
+                f'Не найдена коллекция: {options["collection"]}'
+            )
+        if options['scenario']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if any(part in scenario.name for part in options['scenario'])
+            ]
+        self.cold = options['cold']
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'options': {
+                name: options[name]
+                for name in ('repeat', 'warmup', 'memory_repeat', 'cold')
+            },
+            'dataset': self.get_dataset(),
+            'scenarios': {},
+            'skipped': {},
+        }
+        variables = self.get_variables(options)
+        with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            for scenario in scenarios:
+                result, error = self.measure(scenario, variables, options)
+                if error:
+                    report['skipped'][scenario.name] = error
+                else:
+                    report['scenarios'][scenario.name] = result
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+        if options['compare']:
+            regressions = self.compare(report, options['compare'],
+                                       options['threshold'])
+            if regressions:
+                raise CommandError('Найдены регрессии:\n'
+                                   + '\n'.join(regressions))
@@ -0,0 +1,92 @@
+import json
+import time
+
+from api.search import IngredientIndex
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from recipes.models import Ingredient, Unit
+
+from .benchmark_shopping_list import QueryCounter
+
+DATA_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.json'
+
+
+def orm_search(prefix):
+    return list(Ingredient.objects.filter(
+        name__istartswith=prefix
+    ).values_list('id', 'name', 'unit__name'))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск ингредиентов по префиксу через ORM '
+            'и через индекс в памяти процесса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--file', default=str(DATA_PATH),
+                            help=('JSON с ингредиентами, если база пуста. '
+                                  'Данные откатываются после замера.'))
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Количество проходов по префиксам.')
+
+    def load_ingredients(self, path):
+        with open(path, encoding='utf-8') as file:
+            rows = json.load(file)
+        units = {}
+        for row in rows:
+            unit = row['measurement_unit']
+            if unit not in units:
+                units[unit] = Unit.objects.get_or_create(name=unit)[0]
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=row['name'], unit=units[row['measurement_unit']])
+             for row in rows],
+            ignore_conflicts=True
+        )
+
+    def get_prefixes(self):
+        names = Ingredient.objects.values_list('name', flat=True)
+        return sorted({name[:length]
+                       for name in names
+                       for length in (1, 2, 3)})
+
+    def measure(self, function, prefixes, repeat):
+        counter = QueryCounter()
+        best = None
+        with connection.execute_wrapper(counter):
+            for _ in range(repeat):
+                started = time.perf_counter()
+                results = [function(prefix) for prefix in prefixes]
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+        return best, counter.count // repeat, results
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not Ingredient.objects.exists():
+                self.load_ingredients(options['file'])
+            prefixes = self.get_prefixes()
+            index = IngredientIndex()
+            started = time.perf_counter()
+            index.refresh()
+            build = time.perf_counter() - started
+            orm = self.measure(orm_search, prefixes, options['repeat'])
+            indexed = self.measure(
+                lambda prefix: list(index.search(prefix)),
+                prefixes, options['repeat']
+            )
+            transaction.set_rollback(True)
+        count = len(prefixes)
+        mismatched = sum(sorted(orm_rows) != sorted(index_rows)
+                         for orm_rows, index_rows in zip(orm[2], indexed[2]))
+        if mismatched:
+            self.stdout.write(self.style.WARNING(
+                f'Результаты различаются для {mismatched} из {count} '
+                f'префиксов: локаль БД не приводит регистр так же, '
+                f'как str.casefold()'))
+        self.stdout.write(f'ингредиентов: {len(index.rows)}, '
+                          f'префиксов: {count}, '
+                          f'построение индекса: {build * 1000:.1f} мс')
+        for title, (elapsed, queries, _) in (('ORM', orm),
+                                             ('индекс', indexed)):
+            self.stdout.write(f'{title:>8}: {elapsed / count * 1e6:>10.1f} '
+                              f'мкс/запрос, запросов к БД: {queries}')
@@ -0,0 +1,134 @@
+import time
+
+from api.utils import get_cart_totals, rebuild_cart_totals
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, Unit,
+                            UserRecipe)
+
+User = get_user_model()
+
+CART_SIZES = (10, 100, 1000)
+INGREDIENTS_COUNT = 200
+INGREDIENTS_PER_RECIPE = 8
+
+
+def legacy_shopping_list(user):
+    recipe_dict = {}
+    recipes = Recipe.objects.filter(userrecipe__user=user,
+                                    userrecipe__is_in_shopping_cart=True)
+    for recipe in recipes:
+        recipes_ingredients = RecipeIngredient.objects.filter(
+            recipe=recipe
+        )
+        for recipe_ing in recipes_ingredients:
+            ing = recipe_ing.ingredient
+            if ing.name in recipe_dict.keys():
+                recipe_dict[ing.name]['amount'] += recipe_ing.amount
+            else:
+                recipe_dict[ing.name] = {
+                    'amount': recipe_ing.amount,
+                    'unit': ing.unit.name
+                }
+    return recipe_dict
+
+
+def aggregated_shopping_list(user):
+    return {
+        ingredient['name']: {
+            'amount': ingredient['amount'],
+            'unit': ingredient['unit'],
+        }
+        for ingredient in get_cart_totals(user)
+    }
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает построение списка покупок циклом по рецептам '
+            'и чтением агрегированной корзины. Данные создаются во '
+            'временной транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='*',
+                            default=list(CART_SIZES),
+                            help='Количество рецептов в корзине.')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Количество повторов каждого замера.')
+
+    def measure(self, function, user, repeat):
+        best = None
+        for _ in range(repeat):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                result = function(user)
+                elapsed = time.perf_counter() - started
+            if best is None or elapsed < best[0]:
+                best = (elapsed, counter.count, result)
+        return best
+
+    def create_cart(self, size):
+        user = User.objects.create(username='benchmark_shopping_list',
+                                   email='benchmark@example.com')
+        unit = Unit.objects.create(name='benchmark_unit')
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'benchmark_ingredient_{index}', unit=unit)
+            for index in range(INGREDIENTS_COUNT)
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(name=f'benchmark_recipe_{index}',
+                   author=user,
+                   image='recipes/benchmark.png',
+                   text='benchmark',
+                   cooking_time=1)
+            for index in range(size)
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[
+                    (index * INGREDIENTS_PER_RECIPE + offset)
+                    % INGREDIENTS_COUNT
+                ],
+                amount=offset + 1
+            )
+            for index, recipe in enumerate(recipes)
+            for offset in range(INGREDIENTS_PER_RECIPE)
+        ])
+        UserRecipe.objects.bulk_create([
+            UserRecipe(user=user, recipe=recipe, is_in_shopping_cart=True)
+            for recipe in recipes
+        ])
+        rebuild_cart_totals([user.pk])
+        return user
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"рецептов":>10} {"цикл, мс":>12} '
+                          f'{"запросов":>10} {"корзина, мс":>14} '
+                          f'{"запросов":>10}')
+        for size in options['sizes']:
+            with transaction.atomic():
+                user = self.create_cart(size)
+                legacy = self.measure(legacy_shopping_list, user,
+                                      options['repeat'])
+                aggregated = self.measure(aggregated_shopping_list, user,
+                                          options['repeat'])
+                transaction.set_rollback(True)
+            if legacy[2] != aggregated[2]:
+                self.stdout.write(self.style.ERROR(
+                    f'Результаты для {size} рецептов не совпадают'))
+            self.stdout.write(f'{size:>10} {legacy[0] * 1000:>12.1f} '
+                              f'{legacy[1]:>10} '
+                              f'{aggregated[0] * 1000:>14.1f} '
+                              f'{aggregated[1]:>10}')
@@ -0,0 +1,21 @@
+from api.cache import get_cache_stats, is_shared_cache
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Показывает статистику попаданий в кэш ответов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--name', type=str, default='anonymous',
+                            help='Имя кэша (по умолчанию anonymous).')
+
+    def handle(self, *args, **options):
+        if not is_shared_cache():
+            raise CommandError('Кэш хранится в памяти процесса, статистика '
+                               'другого процесса недоступна. Настройте '
+                               'CACHE_BACKEND.')
+        stats = get_cache_stats(options['name'])
+        self.stdout.write(
+            f'Попаданий: {stats["hits"]}, промахов: {stats["misses"]}, '
+            f'доля попаданий: {stats["hit_ratio"]:.2%}'
+        )
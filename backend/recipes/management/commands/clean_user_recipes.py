@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from recipes.models import UserRecipe
+
+
+class Command(BaseCommand):
+    help = ('Удаляет пустые записи UserRecipe '
+            '(не в избранном и не в корзине).')
+
+    def handle(self, *args, **options):
+        deleted, _ = UserRecipe.objects.filter(
+            is_favorite=False,
+            is_in_shopping_cart=False
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено пустых записей: {deleted}'))
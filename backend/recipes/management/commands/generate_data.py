@@ -0,0 +1,243 @@
+import datetime
+import itertools
+import random
+import time
+from collections import Counter
+
+from api.cache import bump_versions
+from api.signals import VERSIONED_MODELS
+from api.utils import change_ingredient_usage
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from recipes.management.commands.load_recipes import group_by_delta
+from recipes.models import (Follower, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, Tag, UserRecipe)
+
+User = get_user_model()
+
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+)
+FIRST_NAMES = ('Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Сергей')
+LAST_NAMES = ('Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Соколов')
+PERIOD_DAYS = 365
+MAX_SAMPLE_ROUNDS = 10
+
+
+def zipf_weights(size, skew):
+    return list(itertools.accumulate(
+        1 / rank ** skew for rank in range(1, size + 1)
+    ))
+
+
+class Sampler:
+
+    def __init__(self, population, skew, rng):
+        self.population = list(population)
+        self.rng = rng
+        rng.shuffle(self.population)
+        self.cum_weights = zipf_weights(len(self.population), skew)
+
+    def choices(self, count):
+        return self.rng.choices(self.population,
+                                cum_weights=self.cum_weights, k=count)
+
+    def sample(self, count, exclude=None):
+        count = min(count, len(self.population) - (exclude is not None))
+        chosen = set()
+        for _ in range(MAX_SAMPLE_ROUNDS):
+            if len(chosen) >= count:
+                return chosen
+            chosen.update(item for item in self.choices(count - len(chosen))
+                          if item != exclude)
+        rest = [item for item in self.population
+                if item not in chosen and item != exclude]
+        chosen.update(self.rng.sample(rest, count - len(chosen)))
+        return chosen
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетический набор данных: пользователей, рецепты, '
+            'подписки, избранное и корзины с распределением Ципфа, как у '
+            'реального трафика. Нужны ингредиенты, см. import_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000,
+                            help='Количество пользователей.')
+        parser.add_argument('--recipes', type=int, default=10000,
+                            help='Количество рецептов.')
+        parser.add_argument('--follows', type=float, default=10,
+                            help='Среднее количество подписок.')
+        parser.add_argument('--favorites', type=float, default=20,
+                            help='Среднее количество рецептов в избранном.')
+        parser.add_argument('--carts', type=float, default=5,
+                            help='Среднее количество рецептов в корзине.')
+        parser.add_argument('--ingredients', type=float, default=8,
+                            help='Среднее количество ингредиентов рецепта.')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Показатель распределения Ципфа.')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Зерно генератора случайных чисел.')
+        parser.add_argument('--prefix', default='bench',
+                            help='Префикс имён пользователей и рецептов.')
+        parser.add_argument('--password', default='bench-password',
+                            help='Пароль всех созданных пользователей.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Размер пачки bulk_create.')
+
+    def count(self, mean, minimum=0):
+        return max(minimum, round(self.rng.expovariate(1 / mean))
+                   if mean > 0 else 0)
+
+    def create_users(self, options):
+        password = make_password(options['password'])
+        prefix = options['prefix']
+        User.objects.bulk_create([
+            User(username=f'{prefix}_{index}',
+                 email=f'{prefix}_{index}@example.com',
+                 first_name=self.rng.choice(FIRST_NAMES),
+                 last_name=self.rng.choice(LAST_NAMES),
+                 password=password)
+            for index in range(options['users'])
+        ], batch_size=options['batch_size'])
+        return list(User.objects.filter(
+            username__startswith=f'{prefix}_'
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_recipes(self, user_ids, options):
+        prefix = options['prefix']
+        authors = Sampler(user_ids, options['skew'], self.rng)
+        Recipe.objects.bulk_create([
+            Recipe(name=f'{prefix} рецепт {index}',
+                   author_id=author_id,
+                   image=f'recipes/{prefix}.png',
+                   text='Синтетический рецепт для нагрузочного теста.',
+                   cooking_time=self.rng.randint(5, 180))
+            for index, author_id in enumerate(
+                authors.choices(options['recipes'])
+            )
+        ], batch_size=options['batch_size'])
+        recipes = list(Recipe.objects.filter(
+            name__startswith=f'{prefix} рецепт '
+        ).order_by('pk').only('pk', 'author_id', 'created_at'))
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.created_at = now - datetime.timedelta(
+                seconds=self.rng.uniform(0, PERIOD_DAYS * 24 * 3600)
+            )
+        Recipe.objects.bulk_update(recipes, ['created_at'], batch_size=1000)
+        return recipes
+
+    def create_links(self, recipes, options):
+        ingredients = Sampler(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True),
+            options['skew'], self.rng
+        )
+        tag_ids = list(Tag.objects.order_by('pk').values_list('pk',
+                                                              flat=True))
+        links = []
+        tags = []
+        for recipe in recipes:
+            for ingredient_id in ingredients.sample(
+                self.count(options['ingredients'], minimum=1)
+            ):
+                links.append(RecipeIngredient(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500)
+                ))
+            for tag_id in self.rng.sample(
+                tag_ids, self.rng.randint(1, len(tag_ids))
+            ):
+                tags.append(RecipeTag(recipe_id=recipe.pk, tag_id=tag_id))
+        RecipeIngredient.objects.bulk_create(
+            links, batch_size=options['batch_size']
+        )
+        RecipeTag.objects.bulk_create(tags, batch_size=options['batch_size'])
+        usage = Counter(link.ingredient_id for link in links)
+        for delta, ingredient_ids in group_by_delta(usage):
+            change_ingredient_usage(ingredient_ids, delta)
+        return len(links)
+
+    def create_follows(self, user_ids, options):
+        authors = Sampler(user_ids, options['skew'], self.rng)
+        follows = [
+            Follower(user_id=user_id, following_user_id=author_id,
+                     is_subscribed=True)
+            for user_id in user_ids
+            for author_id in authors.sample(self.count(options['follows']),
+                                            exclude=user_id)
+        ]
+        Follower.objects.bulk_create(follows,
+                                     batch_size=options['batch_size'])
+        return len(follows)
+
+    def create_user_recipes(self, user_ids, recipes, options):
+        by_pk = {recipe.pk: recipe for recipe in recipes}
+        popular = Sampler(by_pk, options['skew'], self.rng)
+        now = timezone.now()
+        rows = []
+        for user_id in user_ids:
+            favorites = popular.sample(self.count(options['favorites']))
+            carts = popular.sample(self.count(options['carts']))
+            for recipe_id in favorites | carts:
+                created_at = by_pk[recipe_id].created_at
+                stamps = [created_at + (now - created_at) * self.rng.random()
+                          for _ in range(2)]
+                rows.append(UserRecipe(
+                    user_id=user_id,
+                    recipe_id=recipe_id,
+                    is_favorite=recipe_id in favorites,
+                    favorited_at=(stamps[0] if recipe_id in favorites
+                                  else None),
+                    is_in_shopping_cart=recipe_id in carts,
+                    added_to_cart_at=stamps[1] if recipe_id in carts else None
+                ))
+        UserRecipe.objects.bulk_create(rows, batch_size=options['batch_size'])
+        return len(rows)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        if not Ingredient.objects.exists():
+            raise CommandError('Нет ингредиентов, сначала выполните '
+                               'import_data')
+        if User.objects.filter(
+            username__startswith=f'{options["prefix"]}_'
+        ).exists():
+            raise CommandError(f'Данные с префиксом {options["prefix"]} '
+                               'уже созданы, укажите другой --prefix')
+        started = time.perf_counter()
+        with transaction.atomic():
+            if not Tag.objects.exists():
+                Tag.objects.bulk_create([Tag(name=name, slug=slug)
+                                         for name, slug in DEFAULT_TAGS])
+            user_ids = self.create_users(options)
+            recipes = self.create_recipes(user_ids, options)
+            created = {
+                'users': len(user_ids),
+                'recipes': len(recipes),
+                'ingredients': self.create_links(recipes, options),
+                'follows': self.create_follows(user_ids, options),
+                'user_recipes': self.create_user_recipes(user_ids, recipes,
+                                                         options),
+            }
+        for command, kwargs in (
+            ('recount_recipe_counters', {}),
+            ('recount_user_counters', {}),
+            ('reconcile_shopping_carts', {'fix': True}),
+            ('rebuild_feeds', {}),
+            ('refresh_popular_recipes', {}),
+        ):
+            call_command(command, stdout=self.stdout, **kwargs)
+        bump_versions(*VERSIONED_MODELS)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано за {time.perf_counter() - started:.1f} с: '
+            + ', '.join(f'{name}: {count}'
+                        for name, count in created.items())
+        ))
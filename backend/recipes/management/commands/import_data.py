@@ -1,42 +1,211 @@
 import csv
+import json
 import os
+import time
 
+from api.cache import bump_versions
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from recipes.models import Ingredient, Unit
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import Ingredient, Recipe, Unit
 
 DIR_PATH = os.path.join(settings.BASE_DIR, 'data')
-FILES_PATH = {
-    'ingredients': (os.path.join(DIR_PATH, 'ingredients.csv'), Ingredient),
+FORMATS = ('csv', 'json', 'jsonl')
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    yield from csv.DictReader(file)
+
+
+def read_jsonl(file):
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_json(file):
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(JSON_CHUNK_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise ValueError('Ожидается JSON-массив объектов')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield item
+        buffer = buffer[position:]
+        if not chunk:
+            if buffer.strip():
+                raise ValueError('Незакрытый JSON-массив')
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'jsonl': read_jsonl,
 }
 
 
+def normalize(row):
+    name = (row.get('name') or '').strip()
+    unit = (row.get('measurement_unit') or row.get('unit') or '').strip()
+    return name, unit or None
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
 class Command(BaseCommand):
+    help = ('Импортирует ингредиенты из CSV, JSON или JSONL. Повторный '
+            'запуск обновляет единицы измерения существующих ингредиентов.')
+
     def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*',
+                            help='Пути к файлам для импорта.')
         parser.add_argument('--files', type=str,
-                            help=('Список названий файлов (без расширения)'
-                                  'если не указано - импорт всех файлов.'),
+                            help=('Список названий файлов (без расширения) '
+                                  f'из {DIR_PATH}, если не указано - импорт '
+                                  'всех файлов.'),
                             nargs='*',
                             required=False)
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Формат файлов, по умолчанию по расширению.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество строк в одной пачке записи.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Выполнить импорт и откатить изменения.')
 
-    def handle(self, *args, **options):
+    def get_paths(self, options):
+        if options['paths']:
+            return options['paths']
+        if options['files']:
+            paths = []
+            for name in options['files']:
+                candidates = [os.path.join(DIR_PATH, f'{name}.{extension}')
+                              for extension in FORMATS]
+                existing = [path for path in candidates
+                            if os.path.exists(path)]
+                if not existing:
+                    raise CommandError(f'Не найден файл: {name}')
+                paths.append(existing[0])
+            return paths
+        return sorted(
+            os.path.join(DIR_PATH, name) for name in os.listdir(DIR_PATH)
+            if os.path.splitext(name)[1][1:] in FORMATS
+        )
+
+    def get_format(self, path, options):
+        export_format = options['format'] or os.path.splitext(path)[1][1:]
+        if export_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        return export_format
+
+    def resolve_units(self, names):
+        missing = [name for name in names if name not in self.units]
+        if missing:
+            Unit.objects.bulk_create([Unit(name=name) for name in missing],
+                                     ignore_conflicts=True)
+            self.units.update(Unit.objects.filter(
+                name__in=missing
+            ).values_list('name', 'pk'))
+
+    def write_batch(self, batch):
+        rows = {}
+        for row in batch:
+            name, unit = normalize(row)
+            if name:
+                rows[name] = unit
+            else:
+                self.stats['skipped'] += 1
+        self.resolve_units({unit for unit in rows.values() if unit})
+        existing = {
+            ingredient.name: ingredient
+            for ingredient in Ingredient.objects.filter(name__in=rows)
+        }
+        created = []
+        changed = []
+        for name, unit in rows.items():
+            unit_id = self.units.get(unit)
+            ingredient = existing.get(name)
+            if ingredient is None:
+                created.append(Ingredient(name=name, unit_id=unit_id))
+            elif ingredient.unit_id != unit_id:
+                ingredient.unit_id = unit_id
+                changed.append(ingredient)
+        Ingredient.objects.bulk_create(created, ignore_conflicts=True)
+        Ingredient.objects.bulk_update(changed, ['unit'])
+        self.changed_ids.extend(ingredient.pk for ingredient in changed)
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(changed)
+        self.stats['unchanged'] += len(rows) - len(created) - len(changed)
+
+    def import_file(self, path, options):
+        reader = READERS[self.get_format(path, options)]
         try:
-            with open(FILES_PATH['ingredients'][0], newline='',
-                      encoding='utf-8') as file:
-                dict_reader = csv.DictReader(file)
-                instances = []
-                for row in dict_reader:
-                    row['unit'], created = Unit.objects.get_or_create(
-                        name=row['unit']
-                    )
-                    instance = Ingredient(**row)
-                    instances.append(instance)
-
-                Ingredient.objects.bulk_create(instances)
-
-            self.stdout.write(self.style.SUCCESS(
-                'Данные успешно импортированы из: ingredients.csv'))
-        except KeyError as e:
-            self.stdout.write(self.style.ERROR(f'Не найден файл: {e}'))
-        except Exception as e:
-            self.stdout.write(self.style.ERROR((f'Ошибка: {e}')))
+            with open(path, newline='', encoding='utf-8') as file:
+                for batch in batched(reader(file), options['batch_size']):
+                    self.write_batch(batch)
+                    self.stats['rows'] += len(batch)
+        except FileNotFoundError:
+            raise CommandError(f'Не найден файл: {path}')
+        except (KeyError, ValueError, csv.Error) as error:
+            raise CommandError(f'Ошибка в файле {path}: {error}')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size должен быть положительным')
+        paths = self.get_paths(options)
+        self.units = dict(Unit.objects.values_list('name', 'pk'))
+        self.stats = dict.fromkeys(
+            ('rows', 'created', 'updated', 'unchanged', 'skipped'), 0
+        )
+        self.changed_ids = []
+        started = time.perf_counter()
+        with transaction.atomic():
+            for path in paths:
+                self.import_file(path, options)
+            if options['dry_run']:
+                transaction.set_rollback(True)
+            elif self.changed_ids:
+                Recipe.objects.filter(
+                    ingredients__in=self.changed_ids
+                ).bump_version()
+        elapsed = time.perf_counter() - started
+        if not options['dry_run']:
+            bump_versions(Ingredient, Unit)
+        stats = self.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Проверено" if options["dry_run"] else "Импортировано"} '
+            f'строк: {stats["rows"]} из {len(paths)} файлов за '
+            f'{elapsed:.2f} с ({stats["rows"] / max(elapsed, 1e-9):.0f} '
+            f'строк/с). Создано: {stats["created"]}, обновлено: '
+            f'{stats["updated"]}, без изменений: {stats["unchanged"]}, '
+            f'пропущено: {stats["skipped"]}.'
+        ))
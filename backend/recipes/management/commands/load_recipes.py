@@ -0,0 +1,358 @@
+import csv
+import io
+import json
+import posixpath
+import time
+from collections import Counter
+
+from api.cache import bump_versions
+from api.utils import change_ingredient_usage, change_user_counter
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from recipes.constants import MAX_LENGTH_NAME, MIN_VALUE_COOKING_TIME
+from recipes.management.commands.import_data import batched
+from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+
+User = get_user_model()
+
+MAX_REPORTED_ERRORS = 20
+MAX_SMALL_INTEGER = 32767
+
+STAGING_TABLES = {
+    'staging_recipe': ('line integer, name text, author_id integer, '
+                       'image text, text text, cooking_time integer, '
+                       'created_at timestamptz'),
+    'staging_recipe_ingredient': ('line integer, ingredient_id integer, '
+                                  'amount integer'),
+    'staging_recipe_tag': 'line integer, tag_id integer',
+}
+
+
+class RowError(ValueError):
+    pass
+
+
+def copy_rows(cursor, table, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if value is None else value for value in row])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f"COPY {table} FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+    )
+
+
+def small_integer(value, minimum, message):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise RowError(message)
+    if not minimum <= value <= MAX_SMALL_INTEGER:
+        raise RowError(message)
+    return value
+
+
+def items(row, key):
+    value = row.get(key)
+    return value if isinstance(value, list) else ()
+
+
+def group_by_delta(counter):
+    groups = {}
+    for pk, delta in counter.items():
+        groups.setdefault(delta, []).append(pk)
+    return groups.items()
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты с ингредиентами и тегами из JSONL. '
+            'В каждой строке: name, author (username), text, cooking_time, '
+            'image (путь в MEDIA_ROOT), tags (slug), ingredients '
+            '(name или id и amount), необязательно created_at. Рецепты с '
+            'уже существующими названиями пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к JSONL файлу.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Количество рецептов в одной транзакции.')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Использовать bulk_create вместо COPY '
+                                 'даже на PostgreSQL.')
+        parser.add_argument('--check-images', action='store_true',
+                            help='Проверять наличие картинок в хранилище.')
+        parser.add_argument('--skip-feeds', action='store_true',
+                            help='Не заполнять ленты подписок после '
+                                 'загрузки.')
+
+    def lookup(self, cache, queryset, field, keys):
+        missing = {key for key in keys if key not in cache}
+        if missing:
+            cache.update(queryset.filter(
+                **{f'{field}__in': missing}
+            ).values_list(field, 'pk'))
+        return cache
+
+    def resolve(self, rows):
+        authors = set()
+        tags = set()
+        ingredient_ids = set()
+        ingredient_names = set()
+        for _, row in rows:
+            if not isinstance(row, dict):
+                continue
+            authors.add(str(row.get('author')))
+            tags.update(slug for slug in items(row, 'tags')
+                        if isinstance(slug, str))
+            for item in items(row, 'ingredients'):
+                if not isinstance(item, dict):
+                    continue
+                if isinstance(item.get('id'), int):
+                    ingredient_ids.add(item['id'])
+                elif isinstance(item.get('name'), str):
+                    ingredient_names.add(item['name'])
+        self.lookup(self.authors, User.objects, 'username', authors)
+        self.lookup(self.tags, Tag.objects, 'slug', tags)
+        self.lookup(self.ingredient_names, Ingredient.objects, 'name',
+                    ingredient_names)
+        self.lookup(self.ingredient_ids, Ingredient.objects, 'pk',
+                    ingredient_ids)
+
+    def image_path(self, value, check):
+        path = posixpath.normpath(str(value or ''))
+        max_length = Recipe._meta.get_field('image').max_length
+        if (not value or path.startswith(('/', '..'))
+                or len(path) > max_length
+                or (check and not default_storage.exists(path))):
+            raise RowError(f'некорректная картинка {value!r}')
+        return path
+
+    def prepare(self, line, row, options):
+        if not isinstance(row, dict):
+            raise RowError('ожидается объект')
+        name = str(row.get('name') or '').strip()
+        if not name or len(name) > MAX_LENGTH_NAME:
+            raise RowError('некорректное название')
+        if name in self.seen:
+            raise RowError(f'повтор рецепта {name!r}')
+        author_id = self.authors.get(str(row.get('author')))
+        if author_id is None:
+            raise RowError(f'неизвестный автор {row.get("author")!r}')
+        cooking_time = small_integer(row.get('cooking_time'),
+                                     MIN_VALUE_COOKING_TIME,
+                                     'некорректное время приготовления')
+        created_at = row.get('created_at')
+        if created_at:
+            created_at = parse_datetime(str(created_at))
+            if created_at is None:
+                raise RowError('некорректная дата created_at')
+            if timezone.is_naive(created_at):
+                created_at = timezone.make_aware(created_at)
+        ingredients = {}
+        for item in items(row, 'ingredients'):
+            if not isinstance(item, dict):
+                raise RowError(f'некорректный ингредиент {item!r}')
+            ingredient_id = None
+            if isinstance(item.get('id'), int):
+                ingredient_id = self.ingredient_ids.get(item['id'])
+            elif isinstance(item.get('name'), str):
+                ingredient_id = self.ingredient_names.get(item['name'])
+            if ingredient_id is None:
+                raise RowError(f'неизвестный ингредиент {item!r}')
+            if ingredient_id in ingredients:
+                raise RowError(f'повтор ингредиента {item!r}')
+            ingredients[ingredient_id] = small_integer(
+                item.get('amount'), 1, f'некорректное количество {item!r}'
+            )
+        if not ingredients:
+            raise RowError('не указаны ингредиенты')
+        tag_ids = set()
+        for slug in items(row, 'tags'):
+            if not isinstance(slug, str) or slug not in self.tags:
+                raise RowError(f'неизвестный тег {slug!r}')
+            tag_ids.add(self.tags[slug])
+        return {
+            'line': line,
+            'name': name,
+            'author_id': author_id,
+            'image': self.image_path(row.get('image'),
+                                     options['check_images']),
+            'text': str(row.get('text') or ''),
+            'cooking_time': cooking_time,
+            'created_at': created_at or None,
+            'ingredients': ingredients,
+            'tags': tag_ids,
+        }
+
+    def write_copy(self, recipes):
+        now = timezone.now()
+        quote = connection.ops.quote_name
+        recipe_table = quote(Recipe._meta.db_table)
+        with connection.cursor() as cursor:
+            for table, columns in STAGING_TABLES.items():
+                cursor.execute(f'CREATE TEMP TABLE IF NOT EXISTS {table} '
+                               f'({columns}) ON COMMIT DELETE ROWS')
+            cursor.execute(f'TRUNCATE {", ".join(STAGING_TABLES)}')
+            copy_rows(cursor, 'staging_recipe', (
+                (recipe['line'], recipe['name'], recipe['author_id'],
+                 recipe['image'], recipe['text'], recipe['cooking_time'],
+                 recipe['created_at'])
+                for recipe in recipes
+            ))
+            copy_rows(cursor, 'staging_recipe_ingredient', (
+                (recipe['line'], ingredient_id, amount)
+                for recipe in recipes
+                for ingredient_id, amount in recipe['ingredients'].items()
+            ))
+            copy_rows(cursor, 'staging_recipe_tag', (
+                (recipe['line'], tag_id)
+                for recipe in recipes
+                for tag_id in recipe['tags']
+            ))
+            cursor.execute(
+                f'INSERT INTO {recipe_table} (name, author_id, image, text, '
+                'cooking_time, created_at, updated_at, version, '
+                'favorites_count, in_carts_count) '
+                'SELECT name, author_id, image, text, cooking_time, '
+                'COALESCE(created_at, %s), %s, 1, 0, 0 FROM staging_recipe '
+                'ORDER BY line ON CONFLICT (name) DO NOTHING RETURNING name',
+                [now, now]
+            )
+            loaded = {name for name, in cursor.fetchall()}
+            if not loaded:
+                return loaded
+            for model, staging_table, columns in (
+                (RecipeIngredient, 'staging_recipe_ingredient',
+                 ('ingredient_id', 'amount')),
+                (RecipeTag, 'staging_recipe_tag', ('tag_id',)),
+            ):
+                cursor.execute(
+                    f'INSERT INTO {quote(model._meta.db_table)} '
+                    f'(recipe_id, {", ".join(columns)}) SELECT r.id, '
+                    f'{", ".join(f"l.{column}" for column in columns)} '
+                    f'FROM {staging_table} l '
+                    'JOIN staging_recipe s ON s.line = l.line '
+                    f'JOIN {recipe_table} r ON r.name = s.name '
+                    'WHERE s.name = ANY(%s)',
+                    [list(loaded)]
+                )
+        return loaded
+
+    def write_bulk(self, recipes):
+        existing = set(Recipe.objects.filter(
+            name__in=[recipe['name'] for recipe in recipes]
+        ).values_list('name', flat=True))
+        recipes = [recipe for recipe in recipes
+                   if recipe['name'] not in existing]
+        if not recipes:
+            return set()
+        fields = ('name', 'author_id', 'image', 'text', 'cooking_time')
+        created = Recipe.objects.bulk_create([
+            Recipe(**{field: recipe[field] for field in fields})
+            for recipe in recipes
+        ])
+        ids = dict(Recipe.objects.filter(
+            name__in=[recipe['name'] for recipe in recipes]
+        ).values_list('name', 'pk'))
+        dated = []
+        for instance, recipe in zip(created, recipes):
+            instance.pk = ids[recipe['name']]
+            if recipe['created_at']:
+                instance.created_at = recipe['created_at']
+                dated.append(instance)
+        Recipe.objects.bulk_update(dated, ['created_at'])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe_id=ids[recipe['name']],
+                             ingredient_id=ingredient_id,
+                             amount=amount)
+            for recipe in recipes
+            for ingredient_id, amount in recipe['ingredients'].items()
+        ])
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe_id=ids[recipe['name']], tag_id=tag_id)
+            for recipe in recipes
+            for tag_id in recipe['tags']
+        ])
+        return set(ids)
+
+    def write_batch(self, batch, options):
+        self.resolve(batch)
+        recipes = []
+        for line, row in batch:
+            try:
+                recipes.append(self.prepare(line, row, options))
+            except RowError as error:
+                self.report(line, error)
+                continue
+            self.seen.add(recipes[-1]['name'])
+        if not recipes:
+            return
+        with transaction.atomic():
+            loaded = self.write(recipes)
+            authors = Counter()
+            usage = Counter()
+            for recipe in recipes:
+                if recipe['name'] in loaded:
+                    authors[recipe['author_id']] += 1
+                    usage.update(recipe['ingredients'].keys())
+            for delta, user_ids in group_by_delta(authors):
+                change_user_counter(user_ids, 'recipes_count', delta)
+            for delta, ingredient_ids in group_by_delta(usage):
+                change_ingredient_usage(ingredient_ids, delta)
+        self.stats['loaded'] += len(loaded)
+        self.stats['existing'] += len(recipes) - len(loaded)
+
+    def report(self, line, error):
+        self.stats['errors'] += 1
+        if self.stats['errors'] <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'Строка {line}: {error}')
+
+    def read(self, file):
+        for line, text in enumerate(file, start=1):
+            if not text.strip():
+                continue
+            self.stats['rows'] += 1
+            try:
+                yield line, json.loads(text)
+            except json.JSONDecodeError as error:
+                self.report(line, error)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size должен быть положительным')
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+        self.write = self.write_copy if use_copy else self.write_bulk
+        self.authors = {}
+        self.tags = {}
+        self.ingredient_names = {}
+        self.ingredient_ids = {}
+        self.seen = set()
+        self.stats = Counter()
+        started = time.perf_counter()
+        try:
+            with open(options['path'], encoding='utf-8') as file:
+                for batch in batched(self.read(file), options['batch_size']):
+                    self.write_batch(batch, options)
+        except FileNotFoundError:
+            raise CommandError(f'Не найден файл: {options["path"]}')
+        finally:
+            if self.stats['loaded']:
+                bump_versions(Recipe, RecipeIngredient, RecipeTag,
+                              Ingredient, User)
+        elapsed = time.perf_counter() - started
+        if self.stats['loaded'] and not options['skip_feeds']:
+            call_command('rebuild_feeds', stdout=self.stdout)
+        stats = self.stats
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {stats["loaded"]} из {stats["rows"]} '
+            f'строк за {elapsed:.2f} с '
+            f'({stats["rows"] / max(elapsed, 1e-9):.0f} строк/с, '
+            f'{"COPY" if use_copy else "bulk_create"}). Уже существовали: '
+            f'{stats["existing"]}, ошибок: {stats["errors"]}.'
+        ))
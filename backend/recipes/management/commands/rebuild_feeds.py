@@ -0,0 +1,18 @@
+from api.utils import backfill_feed
+from django.core.management.base import BaseCommand
+from recipes.models import Follower
+
+
+class Command(BaseCommand):
+    help = ('Заполняет ленты подписок последними рецептами авторов. '
+            'Нужно после массовой загрузки рецептов или подписок.')
+
+    def handle(self, *args, **options):
+        subscriptions = Follower.objects.values_list('user_id',
+                                                     'following_user_id')
+        count = 0
+        for user_id, author_id in subscriptions.iterator():
+            backfill_feed(user_id, author_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано подписок: {count}'))
@@ -0,0 +1,54 @@
+from collections import defaultdict
+
+from api.utils import rebuild_cart_totals
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Sum
+from recipes.models import RecipeIngredient, ShoppingCartIngredient
+
+
+class Command(BaseCommand):
+    help = ('Сверяет агрегированные корзины с полным пересчётом '
+            'по рецептам в корзине.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Исправить найденные расхождения.')
+
+    def get_expected(self):
+        expected = defaultdict(dict)
+        rows = RecipeIngredient.objects.filter(
+            recipe__userrecipe__is_in_shopping_cart=True
+        ).values(
+            'ingredient',
+            user=F('recipe__userrecipe__user'),
+        ).annotate(total=Sum('amount')).order_by()
+        for row in rows.iterator():
+            expected[row['user']][row['ingredient']] = row['total']
+        return expected
+
+    def get_actual(self):
+        actual = defaultdict(dict)
+        rows = ShoppingCartIngredient.objects.values_list(
+            'user', 'ingredient', 'amount'
+        )
+        for user, ingredient, amount in rows.iterator():
+            actual[user][ingredient] = amount
+        return actual
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = self.get_expected()
+            actual = self.get_actual()
+            broken = [user for user in expected.keys() | actual.keys()
+                      if expected.get(user, {}) != actual.get(user, {})]
+            if broken and options['fix']:
+                rebuild_cart_totals(broken)
+        if not broken:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено корзин: {len(broken)}'))
+        else:
+            self.stdout.write(self.style.ERROR(
+                f'Корзин с расхождениями: {len(broken)}'))
@@ -0,0 +1,41 @@
+from api.cache import bump_versions
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики избранного и корзин у рецептов '
+            'и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать количество расхождений.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Размер пачки обновлений.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = list(
+                Recipe.objects.with_actual_counters().filter(
+                    ~Q(favorites_count=F('actual_favorites_count'))
+                    | ~Q(in_carts_count=F('actual_in_carts_count'))
+                ).only('pk').order_by()
+            )
+            if drifted and not options['dry_run']:
+                for recipe in drifted:
+                    recipe.favorites_count = recipe.actual_favorites_count
+                    recipe.in_carts_count = recipe.actual_in_carts_count
+                Recipe.objects.bulk_update(drifted,
+                                           Recipe.COUNTER_FIELDS,
+                                           batch_size=options['batch_size'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.ERROR(
+                f'Рецептов с расхождениями: {len(drifted)}'))
+        else:
+            bump_versions(Recipe)
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено рецептов: {len(drifted)}'))
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Follower, Recipe
+
+User = get_user_model()
+
+
+def count_rows(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).values(field).annotate(
+            rows=Count('pk')
+        ).values('rows'),
+        output_field=IntegerField()
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики рецептов, подписчиков и подписок '
+            'у пользователей и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать количество расхождений.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Размер пачки обновлений.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = list(User.objects.annotate(
+                actual_recipes_count=count_rows(Recipe.objects.all(),
+                                                'author'),
+                actual_followers_count=count_rows(Follower.objects.all(),
+                                                  'following_user'),
+                actual_following_count=count_rows(Follower.objects.all(),
+                                                  'user'),
+            ).filter(
+                ~Q(recipes_count=F('actual_recipes_count'))
+                | ~Q(followers_count=F('actual_followers_count'))
+                | ~Q(following_count=F('actual_following_count'))
+            ).only('pk').order_by())
+            if drifted and not options['dry_run']:
+                for user in drifted:
+                    for field in User.COUNTER_FIELDS:
+                        setattr(user, field, getattr(user, f'actual_{field}'))
+                User.objects.bulk_update(drifted,
+                                         User.COUNTER_FIELDS,
+                                         batch_size=options['batch_size'])
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('Расхождений не найдено'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.ERROR(
+                f'Пользователей с расхождениями: {len(drifted)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено пользователей: {len(drifted)}'))
@@ -0,0 +1,104 @@
+import datetime
+
+from api.cache import bump_versions
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import (Case, DurationField, ExpressionWrapper, F,
+                              FloatField, Q, Sum, Value, When)
+from django.db.models.functions import Coalesce, Extract, Power
+from django.utils import timezone
+from recipes.models import PopularRecipe, Tag, UserRecipe
+
+SECONDS_IN_DAY = 24 * 60 * 60
+
+
+def decayed_weight(flag, stamp, weight, half_life_days, now, since):
+    age = ExpressionWrapper(
+        Extract(ExpressionWrapper(
+            Value(now) - Coalesce(F(stamp), F('recipe__created_at')),
+            output_field=DurationField()
+        ), 'epoch'),
+        output_field=FloatField()
+    )
+    condition = Q(**{flag: True})
+    if since is not None:
+        condition &= Q(**{f'{stamp}__gte': since})
+    return Case(
+        When(condition, then=Value(weight) * Power(
+            Value(0.5), age / Value(half_life_days * SECONDS_IN_DAY)
+        )),
+        default=Value(0.0),
+        output_field=FloatField()
+    )
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинг популярных рецептов по избранному '
+            'и корзинам с затуханием по времени.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--period', nargs='*',
+                            default=list(settings.LEADERBOARD_PERIODS),
+                            help='Периоды для пересчёта.')
+        parser.add_argument('--size', type=int,
+                            default=settings.LEADERBOARD_SIZE,
+                            help='Количество рецептов в рейтинге.')
+
+    def get_scores(self, period, now):
+        options = settings.LEADERBOARD_PERIODS[period]
+        since = None
+        rows = UserRecipe.objects.filter(Q(is_favorite=True)
+                                         | Q(is_in_shopping_cart=True))
+        if options['window_days'] is not None:
+            since = now - datetime.timedelta(days=options['window_days'])
+            rows = rows.filter(Q(favorited_at__gte=since)
+                               | Q(added_to_cart_at__gte=since))
+        half_life = options['half_life_days']
+        return rows.values('recipe').annotate(score=Sum(
+            decayed_weight('is_favorite', 'favorited_at',
+                           settings.LEADERBOARD_FAVORITE_WEIGHT,
+                           half_life, now, since)
+            + decayed_weight('is_in_shopping_cart', 'added_to_cart_at',
+                             settings.LEADERBOARD_CART_WEIGHT,
+                             half_life, now, since)
+        )).filter(score__gt=0).order_by('-score', 'recipe')
+
+    def build_entries(self, period, tag, scores, size, now):
+        if tag is not None:
+            scores = scores.filter(recipe__tags=tag)
+        return [
+            PopularRecipe(period=period,
+                          tag=tag,
+                          recipe_id=row['recipe'],
+                          rank=rank,
+                          score=row['score'],
+                          computed_at=now)
+            for rank, row in enumerate(scores[:size], start=1)
+        ]
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Рейтинг пересчитывается только на '
+                               'PostgreSQL')
+        unknown = set(options['period']) - set(settings.LEADERBOARD_PERIODS)
+        if unknown:
+            raise CommandError(
+                f'Неизвестные периоды: {", ".join(sorted(unknown))}')
+        now = timezone.now()
+        tags = [None, *Tag.objects.all()]
+        for period in options['period']:
+            scores = self.get_scores(period, now)
+            entries = [
+                entry
+                for tag in tags
+                for entry in self.build_entries(period, tag, scores,
+                                                options['size'], now)
+            ]
+            with transaction.atomic():
+                stale = PopularRecipe.objects.filter(period=period)
+                stale._raw_delete(stale.db)
+                PopularRecipe.objects.bulk_create(entries, batch_size=1000)
+            self.stdout.write(self.style.SUCCESS(
+                f'Период {period}: записей {len(entries)}'))
+        bump_versions(PopularRecipe)
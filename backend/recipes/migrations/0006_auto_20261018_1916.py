@@ -0,0 +1,60 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_cart_totals(apps, schema_editor):
+    UserRecipe = apps.get_model('recipes', 'UserRecipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model('recipes',
+                                            'ShoppingCartIngredient')
+    carts = {}
+    for user_id, recipe_id in UserRecipe.objects.filter(
+        is_in_shopping_cart=True
+    ).values_list('user', 'recipe').distinct().iterator():
+        carts.setdefault(recipe_id, []).append(user_id)
+    totals = {}
+    for recipe_id, ingredient_id, amount in RecipeIngredient.objects.filter(
+        recipe__in=list(carts)
+    ).values_list('recipe', 'ingredient', 'amount').iterator():
+        for user_id in carts[recipe_id]:
+            key = (user_id, ingredient_id)
+            totals[key] = totals.get(key, 0) + amount
+    ShoppingCartIngredient.objects.bulk_create(
+        [ShoppingCartIngredient(user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                amount=amount)
+         for (user_id, ingredient_id), amount in totals.items()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0005_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cart_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+            ],
+            options={
+                'verbose_name': 'ингредиент корзины',
+                'verbose_name_plural': 'Ингредиенты корзины',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_cart_ingredient'),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
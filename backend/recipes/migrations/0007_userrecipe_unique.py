@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:17
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicates(apps, schema_editor):
+    UserRecipe = apps.get_model('recipes', 'UserRecipe')
+    duplicates = UserRecipe.objects.values('user', 'recipe').annotate(
+        rows=Count('id')
+    ).filter(rows__gt=1).order_by()
+    for duplicate in duplicates.iterator():
+        user_recipes = list(UserRecipe.objects.filter(
+            user=duplicate['user'],
+            recipe=duplicate['recipe']
+        ).order_by('id'))
+        keep = user_recipes[0]
+        keep.is_favorite = any(item.is_favorite for item in user_recipes)
+        keep.is_in_shopping_cart = any(
+            item.is_in_shopping_cart for item in user_recipes
+        )
+        keep.save(update_fields=['is_favorite', 'is_in_shopping_cart'])
+        UserRecipe.objects.filter(
+            pk__in=[item.pk for item in user_recipes[1:]]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_auto_20261018_1916'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='userrecipe',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe'),
+        ),
+    ]
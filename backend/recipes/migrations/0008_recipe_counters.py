@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:21
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_user_recipes(UserRecipe, **flags):
+    return Coalesce(Subquery(
+        UserRecipe.objects.filter(recipe=OuterRef('pk'), **flags).values(
+            'recipe'
+        ).annotate(rows=Count('id')).values('rows'),
+        output_field=IntegerField()
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    UserRecipe = apps.get_model('recipes', 'UserRecipe')
+    Recipe.objects.update(
+        favorites_count=count_user_recipes(UserRecipe, is_favorite=True),
+        in_carts_count=count_user_recipes(UserRecipe,
+                                          is_in_shopping_cart=True),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_userrecipe_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='в избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='в корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userrecipe',
+            name='added_to_cart_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='добавлено в корзину'),
+        ),
+        migrations.AddField(
+            model_name='userrecipe',
+            name='favorited_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='добавлено в избранное'),
+        ),
+        migrations.CreateModel(
+            name='PopularRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'неделя'), ('all', 'всё время')], max_length=10, verbose_name='период')),
+                ('rank', models.PositiveIntegerField(verbose_name='место')),
+                ('score', models.FloatField(verbose_name='рейтинг')),
+                ('computed_at', models.DateTimeField(verbose_name='рассчитано')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='recipes.recipe', verbose_name='рецепт')),
+                ('tag', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.tag', verbose_name='тег')),
+            ],
+            options={
+                'verbose_name': 'популярный рецепт',
+                'verbose_name_plural': 'Популярные рецепты',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='popularrecipe',
+            index=models.Index(fields=['period', 'tag', 'rank'], name='popular_period_tag_rank'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:31
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+TRIGRAM_INDEXES = (
+    ('recipes_ingredient_name_trgm', 'recipes_ingredient', 'name'),
+    ('recipes_ingredient_name_upper_trgm', 'recipes_ingredient',
+     'UPPER(name)'),
+    ('recipes_recipe_name_trgm', 'recipes_recipe', 'name'),
+    ('recipes_recipe_name_upper_trgm', 'recipes_recipe', 'UPPER(name)'),
+)
+
+
+def fill_usage_count(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    Ingredient.objects.update(usage_count=Coalesce(Subquery(
+        RecipeIngredient.objects.filter(
+            ingredient=OuterRef('pk')
+        ).values('ingredient').annotate(rows=Count('id')).values('rows'),
+        output_field=IntegerField()
+    ), 0))
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions "
+                       "WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, expression in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} '
+            f'USING gin (({expression}) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feed_entry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='usage_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, editable=False, verbose_name='использований'),
+        ),
+        migrations.RunPython(fill_usage_count, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
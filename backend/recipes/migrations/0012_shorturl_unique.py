@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:47
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicates(apps, schema_editor):
+    ShortUrl = apps.get_model('recipes', 'ShortUrl')
+    duplicates = list(ShortUrl.objects.values('shortcode').annotate(
+        rows=Count('pk')
+    ).filter(rows__gt=1).order_by().values_list('shortcode', flat=True))
+    if duplicates:
+        raise ValueError(
+            'Короткие коды выданы нескольким ссылкам: '
+            f'{", ".join(duplicates)}. Разделите их вручную перед миграцией.'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_ingredient_usage_trigram'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='shorturl',
+            name='shortcode',
+            field=models.CharField(max_length=15, unique=True, verbose_name='уникальный код'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:05
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+RECIPE_PATH = re.compile(r'/recipes/(\d+)/?$')
+
+
+def link_recipes(apps, schema_editor):
+    ShortUrl = apps.get_model('recipes', 'ShortUrl')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    links = list(ShortUrl.objects.all())
+    recipe_ids = {}
+    for link in links:
+        match = RECIPE_PATH.search(link.url)
+        if match:
+            recipe_ids[link.pk] = int(match.group(1))
+    existing = set(Recipe.objects.filter(
+        pk__in=set(recipe_ids.values())
+    ).values_list('pk', flat=True))
+    for link in links:
+        if recipe_ids.get(link.pk) in existing:
+            link.recipe_id = recipe_ids[link.pk]
+    ShortUrl.objects.bulk_update(links, ['recipe'], batch_size=1000)
+
+
+def unlink_recipes(apps, schema_editor):
+    ShortUrl = apps.get_model('recipes', 'ShortUrl')
+    links = list(ShortUrl.objects.filter(recipe__isnull=False))
+    for link in links:
+        link.url = f'/api/recipes/{link.recipe_id}'
+    ShortUrl.objects.bulk_update(links, ['url'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_shorturl_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shorturl',
+            name='recipe',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='short_urls', to='recipes.recipe', verbose_name='рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='shorturl',
+            name='url',
+            field=models.CharField(default='', max_length=256, verbose_name='ссылка'),
+        ),
+        migrations.RunPython(link_recipes, unlink_recipes),
+        migrations.RemoveField(
+            model_name='shorturl',
+            name='url',
+        ),
+    ]
@@ -1,8 +1,14 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.db.models import (BooleanField, Count, Exists, F, IntegerField,
+                              OuterRef, Prefetch, Subquery, Value, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
 from django.urls import reverse
+from django.utils import timezone
 
-from .constants import MAX_LENGTH_NAME, MAX_LENGTH_SHORTCODE, MAX_LENGTH_SLUG
+from .constants import (MAX_LENGTH_NAME, MAX_LENGTH_PERIOD,
+                        MAX_LENGTH_SHORTCODE, MAX_LENGTH_SLUG)
 
 User = get_user_model()
 
@@ -12,6 +18,12 @@ class UserRecipe(models.Model):
                                               verbose_name='в корзине')
     is_favorite = models.BooleanField(default=False,
                                       verbose_name='избранное')
+    favorited_at = models.DateTimeField(null=True,
+                                        blank=True,
+                                        verbose_name='добавлено в избранное')
+    added_to_cart_at = models.DateTimeField(null=True,
+                                            blank=True,
+                                            verbose_name='добавлено в корзину')
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -23,6 +35,14 @@ class UserRecipe(models.Model):
         verbose_name='рецепт'
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_user_recipe'
+            )
+        ]
+
 
 class Follower(models.Model):
     user = models.ForeignKey(User,
@@ -70,6 +90,10 @@ class Tag(TagIngredientUnit):
 class Ingredient(TagIngredientUnit):
     unit = models.ForeignKey('Unit', null=True, on_delete=models.SET_NULL,
                              verbose_name='единица измерения')
+    usage_count = models.PositiveIntegerField(default=0,
+                                              editable=False,
+                                              db_index=True,
+                                              verbose_name='использований')
 
     class Meta:
         verbose_name = 'ингредиент'
@@ -84,9 +108,91 @@ class Unit(TagIngredientUnit):
         verbose_name_plural = 'Единицы измерения'
 
 
+class RecipeQuerySet(models.QuerySet):
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+                is_author_subscribed=Value(False,
+                                           output_field=BooleanField()),
+            )
+        user_recipes = UserRecipe.objects.filter(user=user,
+                                                 recipe=OuterRef('pk'))
+        return self.annotate(
+            is_favorited=Exists(user_recipes.filter(is_favorite=True)),
+            is_in_shopping_cart=Exists(
+                user_recipes.filter(is_in_shopping_cart=True)
+            ),
+            is_author_subscribed=Exists(
+                Follower.objects.filter(user=user,
+                                        following_user=OuterRef('author'),
+                                        is_subscribed=True)
+            ),
+        )
+
+    def with_related(self, user):
+        authors = User.objects.all()
+        if user.is_authenticated:
+            authors = authors.annotate(is_subscribed=Exists(
+                Follower.objects.filter(user=user,
+                                        following_user=OuterRef('pk'),
+                                        is_subscribed=True)
+            ))
+        else:
+            authors = authors.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return self.prefetch_related(
+            Prefetch('author', queryset=authors),
+            'tags',
+            Prefetch('recipeingredient_set',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient__unit'
+                     )),
+        )
+
+    def with_actual_counters(self):
+        user_recipes = UserRecipe.objects.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(rows=Count('pk')).values('rows')
+        return self.annotate(
+            actual_favorites_count=Coalesce(
+                Subquery(user_recipes.filter(is_favorite=True),
+                         output_field=IntegerField()),
+                0
+            ),
+            actual_in_carts_count=Coalesce(
+                Subquery(user_recipes.filter(is_in_shopping_cart=True),
+                         output_field=IntegerField()),
+                0
+            ),
+        )
+
+    def latest_per_author(self, limit):
+        ranked = self.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author')],
+            order_by=[F('created_at').desc(), F('pk').desc()],
+        )).values('pk', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, limit)
+        )).order_by('author', '-created_at', '-pk')
+
+    def bump_version(self):
+        return self.update(version=F('version') + 1,
+                           updated_at=timezone.now())
+
+
 class Recipe(models.Model):
     created_at = models.DateTimeField(auto_now_add=True,
                                       verbose_name='создано')
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='изменено')
     author = models.ForeignKey(User,
                                related_name='recipes',
                                on_delete=models.CASCADE,
@@ -110,10 +216,42 @@ class Recipe(models.Model):
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='время приготовления'
     )
+    version = models.PositiveIntegerField(default=1,
+                                          editable=False,
+                                          verbose_name='версия')
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name='в избранном'
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        db_index=True,
+        verbose_name='в корзинах'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    COUNTER_FIELDS = ('favorites_count', 'in_carts_count')
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            self.version = F('version') + 1
+            if not (kwargs.get('update_fields') or kwargs.get('force_insert')):
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key
+                    and field.name not in self.COUNTER_FIELDS
+                ]
+        super().save(*args, **kwargs)
+        if self.pk is not None and not isinstance(self.version, int):
+            self.refresh_from_db(fields=['version'])
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'рецепт'
@@ -153,10 +291,97 @@ class RecipeIngredient(models.Model):
         ]
 
 
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(User,
+                             related_name='cart_ingredients',
+                             on_delete=models.CASCADE,
+                             verbose_name='пользователь')
+    ingredient = models.ForeignKey(Ingredient,
+                                   on_delete=models.CASCADE,
+                                   verbose_name='ингредиент')
+    amount = models.PositiveIntegerField(default=0,
+                                         verbose_name='количество')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_ingredient'
+            )
+        ]
+        verbose_name = 'ингредиент корзины'
+        verbose_name_plural = 'Ингредиенты корзины'
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(User,
+                             related_name='feed',
+                             on_delete=models.CASCADE,
+                             verbose_name='пользователь')
+    recipe = models.ForeignKey(Recipe,
+                               related_name='feed_entries',
+                               on_delete=models.CASCADE,
+                               verbose_name='рецепт')
+    created_at = models.DateTimeField(verbose_name='опубликовано')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-recipe'],
+                         name='feed_user_created_recipe'),
+        ]
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+
+class PopularRecipe(models.Model):
+    WEEK = 'week'
+    ALL_TIME = 'all'
+    PERIOD_CHOICES = (
+        (WEEK, 'неделя'),
+        (ALL_TIME, 'всё время'),
+    )
+
+    period = models.CharField(max_length=MAX_LENGTH_PERIOD,
+                              choices=PERIOD_CHOICES,
+                              verbose_name='период')
+    tag = models.ForeignKey(Tag,
+                            null=True,
+                            blank=True,
+                            related_name='+',
+                            on_delete=models.CASCADE,
+                            verbose_name='тег')
+    recipe = models.ForeignKey(Recipe,
+                               related_name='popularity',
+                               on_delete=models.CASCADE,
+                               verbose_name='рецепт')
+    rank = models.PositiveIntegerField(verbose_name='место')
+    score = models.FloatField(verbose_name='рейтинг')
+    computed_at = models.DateTimeField(verbose_name='рассчитано')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['period', 'tag', 'rank'],
+                         name='popular_period_tag_rank'),
+        ]
+        verbose_name = 'популярный рецепт'
+        verbose_name_plural = 'Популярные рецепты'
+
+
 class ShortUrl(models.Model):
-    url = models.CharField(max_length=256,
-                           verbose_name='ссылка')
+    recipe = models.ForeignKey(Recipe,
+                               null=True,
+                               blank=True,
+                               related_name='short_urls',
+                               on_delete=models.SET_NULL,
+                               verbose_name='рецепт')
     shortcode = models.CharField(max_length=MAX_LENGTH_SHORTCODE,
+                                 unique=True,
                                  verbose_name='уникальный код')
 
     def get_short_url(self, domain):
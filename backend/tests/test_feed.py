@@ -0,0 +1,83 @@
+import datetime
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.utils import timezone
+from recipes.models import FeedEntry, Follower, Recipe
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+@override_settings(FEED_FANOUT_FOLLOWER_LIMIT=1)
+class TestFeed(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author, cls.star, cls.fan = User.objects.bulk_create([
+            User(username=username,
+                 first_name='Имя',
+                 last_name='Фамилия',
+                 email=f'{username}@gmail.com')
+            for username in ('reader', 'author', 'star', 'fan')
+        ])
+        cls.token = Token.objects.create(user=cls.reader)
+        cls.url = reverse('api:recipes-feed')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def publish(self, author, name):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(name=name,
+                                           author=author,
+                                           image='recipes/image.png',
+                                           text='Описание',
+                                           cooking_time=10)
+        self.clock += datetime.timedelta(minutes=1)
+        Recipe.objects.filter(pk=recipe.pk).update(created_at=self.clock)
+        FeedEntry.objects.filter(recipe=recipe).update(created_at=self.clock)
+        return recipe
+
+    def read_feed(self):
+        names = []
+        url = self.url
+        params = {'limit': 2}
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            data = response.json()
+            names += [recipe['name'] for recipe in data['results']]
+            url, params = data['next'], None
+        return names
+
+    def test_fan_out_and_read_merge(self):
+        self.clock = timezone.now()
+        self.publish(self.author, 'Старый рецепт')
+        Follower.objects.create(user=self.reader, following_user=self.author,
+                                is_subscribed=True)
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(),
+                         1)
+        for user in (self.reader, self.fan):
+            Follower.objects.create(user=user, following_user=self.star,
+                                    is_subscribed=True)
+        self.publish(self.star, 'Звезда 1')
+        self.publish(self.author, 'Новый рецепт')
+        self.publish(self.star, 'Звезда 2')
+        self.publish(self.fan, 'Чужой рецепт')
+
+        self.assertFalse(FeedEntry.objects.filter(
+            recipe__author=self.star
+        ).exists())
+        self.assertEqual(self.read_feed(), ['Звезда 2', 'Новый рецепт',
+                                            'Звезда 1', 'Старый рецепт'])
+
+        Follower.objects.filter(user=self.reader,
+                                following_user=self.author).delete()
+        self.assertEqual(self.read_feed(), ['Звезда 2', 'Звезда 1'])
+        self.assertEqual(Client().get(self.url).status_code,
+                         HTTPStatus.UNAUTHORIZED)
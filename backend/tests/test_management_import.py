@@ -0,0 +1,157 @@
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from recipes.models import FeedEntry, Follower, Ingredient, Recipe, Tag, Unit
+
+User = get_user_model()
+
+
+class TestImportData(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def run_import(self, *args):
+        output = io.StringIO()
+        call_command('import_data', *args, '--batch-size', '2',
+                     stdout=output)
+        return output.getvalue()
+
+    def ingredients(self):
+        return dict(Ingredient.objects.values_list('name', 'unit__name'))
+
+    def test_formats_and_rerun(self):
+        csv_path = self.write('ingredients.csv',
+                              'name,unit\nКапуста,г\nМасло,г\nСоль,\n')
+        json_path = self.write('ingredients.json', json.dumps([
+            {'name': 'Капуста', 'measurement_unit': 'кг'},
+            {'name': 'Молоко', 'measurement_unit': 'мл'},
+        ], ensure_ascii=False))
+        jsonl_path = self.write('ingredients.jsonl', (
+            '{"name": "Яйцо", "measurement_unit": "шт."}\n\n'
+            '{"name": "", "measurement_unit": "г"}\n'
+        ))
+        output = self.run_import(csv_path)
+        self.assertIn('Создано: 3', output)
+        output = self.run_import(csv_path)
+        self.assertIn('Создано: 0, обновлено: 0, без изменений: 3', output)
+
+        output = self.run_import(json_path, jsonl_path)
+        self.assertIn('Создано: 2, обновлено: 1', output)
+        self.assertIn('пропущено: 1', output)
+        self.assertEqual(self.ingredients(), {
+            'Капуста': 'кг',
+            'Масло': 'г',
+            'Соль': None,
+            'Молоко': 'мл',
+            'Яйцо': 'шт.',
+        })
+        self.assertEqual(Unit.objects.count(), 4)
+
+    def test_dry_run(self):
+        path = self.write('ingredients.jsonl',
+                          '{"name": "Капуста", "unit": "г"}\n')
+        output = io.StringIO()
+        call_command('import_data', path, '--dry-run', stdout=output)
+        self.assertIn('Создано: 1', output.getvalue())
+        self.assertFalse(Ingredient.objects.exists())
+        self.assertFalse(Unit.objects.exists())
+
+    def test_invalid_file(self):
+        path = self.write('ingredients.json', '[{"name": "Капуста"')
+        with self.assertRaises(CommandError):
+            self.run_import(path)
+        with self.assertRaises(CommandError):
+            self.run_import(self.write('ingredients.txt', ''))
+
+
+class TestLoadRecipes(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author',
+                                         email='author@gmail.com')
+        cls.reader = User.objects.create(username='reader',
+                                         email='reader@gmail.com')
+        Follower.objects.create(user=cls.reader, following_user=cls.author)
+        unit = Unit.objects.create(name='г')
+        cls.cabbage = Ingredient.objects.create(name='Капуста', unit=unit)
+        cls.butter = Ingredient.objects.create(name='Масло', unit=unit)
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'recipes.jsonl')
+        rows = [
+            {'name': 'Рецепт 1', 'author': 'author', 'text': 'Описание',
+             'cooking_time': 10, 'image': 'recipes/1.png',
+             'tags': ['breakfast'],
+             'created_at': '2024-01-01T10:00:00',
+             'ingredients': [{'name': 'Капуста', 'amount': 10},
+                             {'id': self.butter.id, 'amount': 5}]},
+            {'name': 'Рецепт 2', 'author': 'author', 'text': 'Описание',
+             'cooking_time': 5, 'image': 'recipes/2.png',
+             'ingredients': [{'name': 'Капуста', 'amount': 1}]},
+            {'name': 'Рецепт 3', 'author': 'nobody', 'cooking_time': 5,
+             'image': 'recipes/3.png',
+             'ingredients': [{'name': 'Капуста', 'amount': 1}]},
+            {'name': 'Рецепт 4', 'author': 'author', 'cooking_time': 5,
+             'image': '../secret.png',
+             'ingredients': [{'name': 'Капуста', 'amount': 1}]},
+        ]
+        with open(self.path, 'w', encoding='utf-8') as file:
+            for row in rows:
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+            file.write('{broken\n')
+
+    def load(self, *args):
+        output = io.StringIO()
+        call_command('load_recipes', self.path, '--batch-size', '2', *args,
+                     stdout=output, stderr=io.StringIO())
+        return output.getvalue()
+
+    def check_loaded(self, *args):
+        output = self.load(*args)
+        self.assertIn('Загружено рецептов: 2 из 5', output)
+        self.assertIn('ошибок: 3', output)
+        recipe = Recipe.objects.get(name='Рецепт 1')
+        self.assertEqual(recipe.image.name, 'recipes/1.png')
+        self.assertEqual(recipe.created_at.year, 2024)
+        self.assertEqual(list(recipe.tags.values_list('slug', flat=True)),
+                         ['breakfast'])
+        self.assertEqual(dict(recipe.recipeingredient_set.values_list(
+            'ingredient__name', 'amount'
+        )), {'Капуста': 10, 'Масло': 5})
+        self.author.refresh_from_db()
+        self.cabbage.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+        self.assertEqual(self.cabbage.usage_count, 2)
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(),
+                         2)
+
+        output = self.load(*args)
+        self.assertIn('Загружено рецептов: 0 из 5', output)
+        self.assertIn('Уже существовали: 2', output)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 2)
+
+    def test_copy(self):
+        self.check_loaded()
+
+    def test_bulk_create(self):
+        self.check_loaded('--no-copy')
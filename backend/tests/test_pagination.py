@@ -0,0 +1,80 @@
+import warnings
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from recipes.models import Recipe
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+class TestKeysetPagination(TestCase):
+    RECIPES_COUNT = 12
+    PAGE_SIZE = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author',
+                                         first_name='Имя',
+                                         last_name='Фамилия',
+                                         email='author@gmail.com')
+        Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {index}',
+                   author=cls.author,
+                   image='recipes/image.png',
+                   text='Описание',
+                   cooking_time=10)
+            for index in range(cls.RECIPES_COUNT)
+        ])
+        cls.url = reverse('api:recipes-list')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get_page(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotIn('count', response.data)
+        return response.data
+
+    def test_cursor_walks_all_recipes_in_order(self):
+        expected = list(Recipe.objects.order_by('-created_at', '-id')
+                        .values_list('id', flat=True))
+        page = self.get_page(self.url, {'pagination': 'cursor',
+                                        'limit': self.PAGE_SIZE})
+        self.assertIsNone(page['previous'])
+        ids = [recipe['id'] for recipe in page['results']]
+        pages = [page]
+        while page['next']:
+            page = self.get_page(page['next'])
+            self.assertLessEqual(len(page['results']), self.PAGE_SIZE)
+            ids.extend(recipe['id'] for recipe in page['results'])
+            pages.append(page)
+        self.assertEqual(ids, expected)
+
+        previous = self.get_page(pages[-1]['previous'])
+        self.assertEqual(previous['results'], pages[-2]['results'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_user_pages_are_ordered(self):
+        User.objects.bulk_create([
+            User(username=f'user{index}', email=f'user{index}@gmail.com')
+            for index in range(self.PAGE_SIZE)
+        ])
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            page = self.client.get(reverse('api:users-list'),
+                                   {'limit': self.PAGE_SIZE, 'page': 2})
+        self.assertEqual(page.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            [user['id'] for user in page.data['results']],
+            list(User.objects.order_by('id').values_list(
+                'id', flat=True
+            )[self.PAGE_SIZE:self.PAGE_SIZE * 2])
+        )
@@ -0,0 +1,110 @@
+import datetime
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models.signals import post_delete
+from django.test import Client, TestCase
+from django.utils import timezone
+from recipes.models import PopularRecipe, Recipe, Tag, UserRecipe
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+class TestPopularRecipes(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([
+            User(username=f'user{index}',
+                 first_name='Имя',
+                 last_name='Фамилия',
+                 email=f'user{index}@gmail.com')
+            for index in range(3)
+        ])
+        cls.tokens = [Token.objects.create(user=user) for user in cls.users]
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.recipes = Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {index}',
+                   author=cls.users[0],
+                   image='recipes/image.png',
+                   text='Описание',
+                   cooking_time=10)
+            for index in range(3)
+        ])
+        cls.recipes[2].tags.add(cls.tag)
+        cls.url = reverse('api:recipes-popular')
+
+    def setUp(self):
+        cache.clear()
+
+    def mark(self, user_index, recipe_index, url_name):
+        client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.tokens[user_index].key}'
+        )
+        response = client.post(reverse(url_name, args=(
+            self.recipes[recipe_index].id,
+        )))
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+
+    def names(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [recipe['name'] for recipe in response.json()['results']]
+
+    def test_leaderboard(self):
+        for user_index in range(3):
+            self.mark(user_index, 0, 'api:recipes-favorite-recipe')
+        self.mark(0, 1, 'api:recipes-favorite-recipe')
+        self.mark(1, 1, 'api:recipes-favorite-recipe')
+        self.mark(0, 2, 'api:recipes-recipe-shopping-cart')
+        UserRecipe.objects.filter(recipe=self.recipes[0]).update(
+            favorited_at=timezone.now() - datetime.timedelta(days=10)
+        )
+        self.assertEqual(self.names(), [])
+
+        call_command('refresh_popular_recipes', stdout=None)
+        self.assertEqual(self.names(), ['Рецепт 1', 'Рецепт 2'])
+        self.assertEqual(self.names(period='all'),
+                         ['Рецепт 0', 'Рецепт 1', 'Рецепт 2'])
+        self.assertEqual(self.names(period='all', tag='breakfast'),
+                         ['Рецепт 2'])
+        self.assertEqual(self.names(period='all', limit=1, page=2),
+                         ['Рецепт 1'])
+        self.assertEqual(
+            PopularRecipe.objects.filter(period='all', tag=None).count(), 3
+        )
+        response = self.client.get(self.url, {'period': 'year'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_undated_rows_are_left_out_of_windows(self):
+        self.mark(0, 0, 'api:recipes-favorite-recipe')
+        self.mark(1, 1, 'api:recipes-favorite-recipe')
+        UserRecipe.objects.filter(recipe=self.recipes[1]).update(
+            favorited_at=None
+        )
+        call_command('refresh_popular_recipes', stdout=None)
+        self.assertEqual(self.names(), ['Рецепт 0'])
+        self.assertEqual(self.names(period='all'), ['Рецепт 0', 'Рецепт 1'])
+
+    def test_refresh_skips_per_row_delete_signals(self):
+        self.mark(0, 0, 'api:recipes-favorite-recipe')
+        self.mark(1, 1, 'api:recipes-favorite-recipe')
+        call_command('refresh_popular_recipes', stdout=None)
+        deleted = []
+
+        def receiver(sender, **kwargs):
+            deleted.append(kwargs['instance'])
+
+        post_delete.connect(receiver, sender=PopularRecipe)
+        try:
+            call_command('refresh_popular_recipes', stdout=None)
+        finally:
+            post_delete.disconnect(receiver, sender=PopularRecipe)
+        self.assertEqual(deleted, [])
+        self.assertEqual(
+            PopularRecipe.objects.filter(period='all', tag=None).count(), 2
+        )
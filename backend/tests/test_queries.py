@@ -0,0 +1,160 @@
+from http import HTTPStatus
+
+from api.serializers import RecipeSerializer
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import (Follower, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, Tag, Unit, UserRecipe)
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+class TestRecipeListQueries(TestCase):
+    RECIPES_COUNT = 30
+    SMALL_PAGE = 5
+    LARGE_PAGE = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(username='reader',
+                                         first_name='Читатель',
+                                         last_name='Читатель',
+                                         email='reader@gmail.com')
+        cls.token = Token.objects.create(user=cls.reader)
+        authors = User.objects.bulk_create([
+            User(username=f'author{index}',
+                 first_name='Имя',
+                 last_name='Фамилия',
+                 email=f'author{index}@gmail.com')
+            for index in range(3)
+        ])
+        Follower.objects.create(user=cls.reader,
+                                following_user=authors[0],
+                                is_subscribed=True)
+        unit = Unit.objects.create(name='г')
+        ingredients = Ingredient.objects.bulk_create([
+            Ingredient(name=f'Ингредиент {index}', unit=unit)
+            for index in range(3)
+        ])
+        tags = Tag.objects.bulk_create([
+            Tag(name='Завтрак', slug='breakfast'),
+            Tag(name='Обед', slug='lunch'),
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {index}',
+                   author=authors[index % len(authors)],
+                   image='recipes/image.png',
+                   text='Описание',
+                   cooking_time=10)
+            for index in range(cls.RECIPES_COUNT)
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+            for recipe in recipes
+            for ingredient in ingredients
+        ])
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag=tag)
+            for recipe in recipes
+            for tag in tags
+        ])
+        UserRecipe.objects.bulk_create([
+            UserRecipe(user=cls.reader, recipe=recipe, is_favorite=True)
+            for recipe in recipes[::2]
+        ])
+        cls.url = reverse('api:recipes-list')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return len(context.captured_queries), response
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        small, response = self.count_queries(self.url, limit=self.SMALL_PAGE)
+        self.assertEqual(len(response.data['results']), self.SMALL_PAGE)
+        cache.clear()
+        large, response = self.count_queries(self.url, limit=self.LARGE_PAGE)
+        self.assertEqual(len(response.data['results']), self.LARGE_PAGE)
+        self.assertEqual(small, large)
+
+    def test_cached_fragments_skip_related_queries(self):
+        cold, response = self.count_queries(self.url, limit=self.LARGE_PAGE)
+        warm, cached = self.count_queries(self.url, limit=self.LARGE_PAGE)
+        self.assertLess(warm, cold)
+        self.assertEqual(cached.json(), response.json())
+        recipe = Recipe.objects.get(name=response.data['results'][0]['name'])
+        recipe.text = 'Новое описание'
+        recipe.save()
+        _, response = self.count_queries(self.url, limit=self.LARGE_PAGE)
+        self.assertEqual(response.data['results'][0]['text'],
+                         'Новое описание')
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_cached_fragments_use_request_host(self):
+        User.objects.filter(username='author0').update(avatar='users/a.png')
+        recipe = Recipe.objects.with_related(self.reader).filter(
+            author__username='author0'
+        ).first()
+        request = RequestFactory().post('/', HTTP_HOST='first.example')
+        RecipeSerializer(recipe, context={'request': request}).data
+        response = self.client.get(reverse('api:recipes-detail',
+                                           args=(recipe.id,)),
+                                   HTTP_HOST='second.example')
+        self.assertEqual(response.data['image'],
+                         'http://second.example/media/recipes/image.png')
+        self.assertEqual(response.data['author']['avatar'],
+                         'http://second.example/media/users/a.png')
+
+    def test_list_flags_are_annotated(self):
+        _, response = self.count_queries(self.url, limit=self.LARGE_PAGE)
+        results = {recipe['name']: recipe for recipe in
+                   response.data['results']}
+        for recipe in UserRecipe.objects.filter(user=self.reader):
+            self.assertTrue(results[recipe.recipe.name]['is_favorited'])
+        subscribed = [recipe['author']['is_subscribed']
+                      for recipe in results.values()
+                      if recipe['author']['username'] == 'author0']
+        self.assertTrue(all(subscribed))
+        self.assertFalse(any(recipe['is_in_shopping_cart']
+                             for recipe in results.values()))
+
+    def test_favorite_filter_does_not_write(self):
+        user_recipes_count = UserRecipe.objects.count()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {'is_favorited': 1,
+                                                  'limit': self.LARGE_PAGE})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.data['count'],
+                         UserRecipe.objects.filter(user=self.reader,
+                                                   is_favorite=True).count())
+        self.assertEqual(UserRecipe.objects.count(), user_recipes_count)
+        self.assertFalse(any(
+            query['sql'].startswith(('INSERT', 'UPDATE'))
+            for query in context.captured_queries
+        ))
+
+    def test_list_count_is_cached(self):
+        first, response = self.count_queries(self.url)
+        self.assertEqual(response.data['count'], self.RECIPES_COUNT)
+        second, response = self.count_queries(self.url)
+        self.assertLess(second, first)
+        Recipe.objects.first().delete()
+        _, response = self.count_queries(self.url)
+        self.assertEqual(response.data['count'], self.RECIPES_COUNT - 1)
+
+    def test_retrieve_query_count_is_fixed(self):
+        recipe = Recipe.objects.first()
+        url = reverse('api:recipes-detail', args=(recipe.id,))
+        queries, response = self.count_queries(url)
+        self.assertEqual(response.data['id'], recipe.id)
+        self.assertLessEqual(queries, 7)
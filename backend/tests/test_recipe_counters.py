@@ -0,0 +1,81 @@
+import io
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from recipes.models import Recipe
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+class TestRecipeCounters(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([
+            User(username=f'user{index}',
+                 first_name='Имя',
+                 last_name='Фамилия',
+                 email=f'user{index}@gmail.com')
+            for index in range(3)
+        ])
+        cls.tokens = [Token.objects.create(user=user) for user in cls.users]
+        cls.recipes = Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {index}',
+                   author=cls.users[0],
+                   image='recipes/image.png',
+                   text='Описание',
+                   cooking_time=10)
+            for index in range(3)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def favorite(self, user_index, recipe_index, method='post'):
+        client = Client(
+            HTTP_AUTHORIZATION=f'Token {self.tokens[user_index].key}'
+        )
+        url = reverse('api:recipes-favorite-recipe',
+                      args=(self.recipes[recipe_index].id,))
+        return getattr(client, method)(url)
+
+    def counts(self):
+        return dict(Recipe.objects.values_list('name', 'favorites_count'))
+
+    def test_toggles_update_counters_and_ordering(self):
+        for user_index, recipe_index in ((0, 1), (1, 1), (2, 1), (0, 2)):
+            response = self.favorite(user_index, recipe_index)
+            self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.favorite(0, 2)
+        self.favorite(1, 1, method='delete')
+        self.assertEqual(self.counts(), {'Рецепт 0': 0,
+                                         'Рецепт 1': 2,
+                                         'Рецепт 2': 1})
+
+        response = self.client.get(reverse('api:recipes-list'),
+                                   {'ordering': '-favorites_count'})
+        self.assertEqual(
+            [(recipe['name'], recipe['favorites_count'])
+             for recipe in response.json()['results']],
+            [('Рецепт 1', 2), ('Рецепт 2', 1), ('Рецепт 0', 0)]
+        )
+
+        self.users[2].delete()
+        self.assertEqual(self.counts()['Рецепт 1'], 1)
+
+    def test_recount_repairs_drift(self):
+        self.favorite(0, 0)
+        Recipe.objects.update(favorites_count=5, in_carts_count=3)
+        output = io.StringIO()
+        call_command('recount_recipe_counters', stdout=output)
+        self.assertIn('Исправлено рецептов: 3', output.getvalue())
+        self.assertEqual(self.counts(), {'Рецепт 0': 1,
+                                         'Рецепт 1': 0,
+                                         'Рецепт 2': 0})
+        call_command('recount_recipe_counters', stdout=output)
+        self.assertIn('Расхождений не найдено', output.getvalue())
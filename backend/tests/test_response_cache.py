@@ -0,0 +1,198 @@
+from http import HTTPStatus
+
+from api.cache import check_shared_cache, get_cache_stats, get_versions
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredient, Recipe, Tag, Unit
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+class TestAnonymousCache(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        unit = Unit.objects.create(name='г')
+        Ingredient.objects.create(name='Капуста', unit=unit)
+        cls.tags_url = reverse('api:tags-list')
+        cls.ingredients_url = reverse('api:ingredients-list')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_repeated_request_is_served_from_cache(self):
+        response = self.client.get(self.tags_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as context:
+            cached = self.client.get(self.tags_url)
+        self.assertEqual(cached.status_code, HTTPStatus.OK)
+        self.assertEqual(cached['X-Cache'], 'HIT')
+        self.assertEqual(cached.json(), response.json())
+        self.assertEqual(len(context.captured_queries), 0)
+        self.assertEqual(get_cache_stats('anonymous')['hits'], 1)
+        self.assertEqual(get_cache_stats('anonymous')['misses'], 1)
+
+    def test_process_local_cache_is_reported(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)],
+                         ['api.W001'])
+        with self.assertRaises(CommandError):
+            call_command('cache_stats')
+        dummy = {'default': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        }}
+        with override_settings(CACHES=dummy):
+            self.assertEqual(check_shared_cache(None), [])
+
+    def test_query_params_are_normalized(self):
+        self.client.get(self.ingredients_url, {'name': 'К', 'x': 1})
+        response = self.client.get(f'{self.ingredients_url}?x=1&name=К')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_cache_is_invalidated_on_change(self):
+        self.client.get(self.tags_url)
+        Tag.objects.create(name='Обед', slug='lunch')
+        response = self.client.get(self.tags_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.json()), 2)
+        self.client.get(self.ingredients_url)
+        Unit.objects.filter(name='г').get().save()
+        response = self.client.get(self.ingredients_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+
+class TestRecipeCounterCache(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user',
+                                       email='user@gmail.com')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.recipe = Recipe.objects.create(name='Рецепт',
+                                           author=cls.user,
+                                           image='recipes/image.png',
+                                           text='Описание',
+                                           cooking_time=10)
+        cls.list_url = reverse('api:recipes-list')
+        cls.detail_url = reverse('api:recipes-detail', args=(cls.recipe.id,))
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_toggles_keep_cached_pages(self):
+        ordered = {'ordering': '-favorites_count'}
+        for url, params in ((self.list_url, {}), (self.detail_url, {}),
+                            (self.list_url, ordered)):
+            self.client.get(url, params)
+        version = get_versions(Recipe)
+        response = Client(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        ).post(reverse('api:recipes-favorite-recipe',
+                       args=(self.recipe.id,)))
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(get_versions(Recipe), version)
+
+        response = self.client.get(self.list_url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['results'][0]['favorites_count'], 1)
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['favorites_count'], 1)
+        response = self.client.get(self.list_url, ordered)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+
+class TestConditionalRequests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author',
+                                         first_name='Имя',
+                                         last_name='Фамилия',
+                                         email='author@gmail.com')
+        cls.recipe = Recipe.objects.create(name='Рецепт',
+                                           author=cls.author,
+                                           image='recipes/image.png',
+                                           text='Описание',
+                                           cooking_time=10)
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.recipe_url = reverse('api:recipes-detail', args=(cls.recipe.id,))
+        cls.tags_url = reverse('api:tags-list')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_matching_etag_returns_not_modified(self):
+        for url in (self.recipe_url, self.tags_url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, HTTPStatus.OK)
+            self.assertIn('Last-Modified', response)
+            etag = response['ETag']
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_etag_changes_with_recipe(self):
+        etag = self.client.get(self.recipe_url)['ETag']
+        self.recipe.text = 'Новое описание'
+        self.recipe.save()
+        response = self.client.get(self.recipe_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_non_numeric_pk_is_not_found(self):
+        response = self.client.get('/api/recipes/abc/',
+                                   HTTP_IF_NONE_MATCH='"abc"')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+@override_settings(VERSION_CHECK_INTERVAL=0)
+class TestReferenceBundle(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.unit = Unit.objects.create(name='г')
+        Ingredient.objects.create(name='Капуста', unit=cls.unit)
+        cls.url = reverse('api:reference')
+
+    def setUp(self):
+        cache.clear()
+
+    def fetch_bundle(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertIn('no-cache', response['Cache-Control'])
+        return self.client.get(response['Location'])
+
+    def test_bundle_is_immutable_and_versioned(self):
+        response = self.fetch_bundle()
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('immutable', response['Cache-Control'])
+        data = response.json()
+        self.assertEqual(data['tags'][0]['slug'], 'breakfast')
+        self.assertEqual(data['ingredients'][0]['measurement_unit'], 'г')
+        bundle_url = response.wsgi_request.path
+
+        with self.assertNumQueries(0):
+            response = self.client.get(bundle_url,
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+        self.unit.name = 'кг'
+        self.unit.save()
+        response = self.client.get(bundle_url)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        response = self.fetch_bundle()
+        self.assertNotEqual(response.wsgi_request.path, bundle_url)
+        self.assertEqual(response.json()['ingredients'][0]['measurement_unit'],
+                         'кг')
@@ -0,0 +1,166 @@
+from http import HTTPStatus
+
+from api.utils import create_recipe_ingredients
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag, Unit
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+@override_settings(VERSION_CHECK_INTERVAL=0)
+class TestIngredientIndex(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.unit = Unit.objects.create(name='г')
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, unit=cls.unit)
+            for name in ('Капуста', 'капуста квашеная', 'картофель',
+                         'кабачок', 'морковь')
+        ])
+        cls.url = reverse('api:ingredients-list')
+
+    def setUp(self):
+        cache.clear()
+
+    def names(self, prefix):
+        response = self.client.get(self.url, {'name': prefix})
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_case_insensitive_prefix(self):
+        self.client.get(self.url, {'name': 'к'})
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('КАП'),
+                             ['Капуста', 'капуста квашеная'])
+        self.assertEqual(self.names('ка'), ['кабачок', 'Капуста',
+                                            'капуста квашеная', 'картофель'])
+        self.assertEqual(self.names('я'), [])
+        response = self.client.get(self.url, {'name': 'мор'})
+        self.assertEqual(response.json(), [{
+            'id': Ingredient.objects.get(name='морковь').id,
+            'name': 'морковь',
+            'measurement_unit': 'г',
+        }])
+
+    def test_refreshes_after_change(self):
+        self.assertEqual(self.names('мор'), ['морковь'])
+        Ingredient.objects.create(name='морошка', unit=self.unit)
+        self.unit.name = 'кг'
+        self.unit.save()
+        response = self.client.get(self.url, {'name': 'мор'})
+        self.assertEqual([(ingredient['name'], ingredient['measurement_unit'])
+                          for ingredient in response.json()],
+                         [('морковь', 'кг'), ('морошка', 'кг')])
+
+
+@override_settings(VERSION_CHECK_INTERVAL=0)
+class TestRankedSearch(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        unit = Unit.objects.create(name='г')
+        usage = {'картофель': 5, 'капуста': 1, 'капуста белокочанная': 3,
+                 'цветная капуста': 2, 'морковь': 4}
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, unit=unit, usage_count=count)
+            for name, count in usage.items()
+        ])
+        cls.author = User.objects.create(username='author',
+                                         first_name='Имя',
+                                         last_name='Фамилия',
+                                         email='author@gmail.com')
+        Recipe.objects.bulk_create([
+            Recipe(name=name,
+                   author=cls.author,
+                   image='recipes/image.png',
+                   text='Описание',
+                   cooking_time=10,
+                   favorites_count=count)
+            for name, count in (('Щи из капусты', 2), ('Капустный пирог', 1),
+                                ('Голубцы', 7))
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse('api:ingredients-list'),
+                                   {'search': query})
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_tiers_then_usage(self):
+        self.assertEqual(self.search('КАП'), ['капуста белокочанная',
+                                              'капуста',
+                                              'цветная капуста'])
+        self.assertEqual(self.search('уст'), ['капуста белокочанная',
+                                              'цветная капуста',
+                                              'капуста'])
+        self.assertEqual(self.search('капусат')[-1], 'капуста')
+        self.assertEqual(self.search('ананас'), [])
+        self.assertEqual(self.search('ус'), ['капуста белокочанная',
+                                             'цветная капуста',
+                                             'капуста'])
+        self.assertEqual(self.search('ь'), ['картофель', 'морковь'])
+
+    def test_recipe_search(self):
+        response = self.client.get(reverse('api:recipes-list'),
+                                   {'search': 'капуст'})
+        self.assertEqual([recipe['name']
+                          for recipe in response.json()['results']],
+                         ['Капустный пирог', 'Щи из капусты'])
+
+    def test_recipe_search_follows_favorites(self):
+        first, second = Recipe.objects.bulk_create([
+            Recipe(name=name,
+                   author=self.author,
+                   image='recipes/image.png',
+                   text='Описание',
+                   cooking_time=10)
+            for name in ('Борщ зелёный', 'Борщ красный')
+        ])
+
+        def search():
+            response = self.client.get(reverse('api:recipes-list'),
+                                       {'search': 'борщ'})
+            return [recipe['name'] for recipe in response.json()['results']]
+
+        self.assertEqual(search(), [first.name, second.name])
+        token = Token.objects.create(user=self.author)
+        response = Client(HTTP_AUTHORIZATION=f'Token {token.key}').post(
+            reverse('api:recipes-favorite-recipe', args=(second.id,))
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        self.assertEqual(search(), [second.name, first.name])
+
+    def test_created_recipes_update_ingredient_ranking(self):
+        self.assertEqual(self.search('капуста')[:2], ['капуста белокочанная',
+                                                      'капуста'])
+        cabbage = Ingredient.objects.get(name='капуста')
+        tag = Tag.objects.create(name='Обед', slug='lunch')
+        for recipe in Recipe.objects.all():
+            create_recipe_ingredients(recipe,
+                                      [{'id': cabbage, 'amount': 1}], [tag])
+        self.assertEqual(self.search('капуста')[:2], ['капуста',
+                                                      'капуста белокочанная'])
+
+    @override_settings(SEARCH_RESULTS_LIMIT=2)
+    def test_results_are_capped(self):
+        self.assertEqual(self.search('кап'), ['капуста белокочанная',
+                                              'капуста'])
+
+    def test_usage_count_follows_recipe_ingredients(self):
+        ingredient = Ingredient.objects.get(name='морковь')
+        recipe_ingredient = RecipeIngredient.objects.create(
+            recipe=Recipe.objects.first(),
+            ingredient=ingredient,
+            amount=1
+        )
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.usage_count, 5)
+        recipe_ingredient.delete()
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.usage_count, 4)
@@ -0,0 +1,179 @@
+import csv
+import io
+import json
+from http import HTTPStatus
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartIngredient, Unit)
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+class TestShoppingCartDownload(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user',
+                                       first_name='Имя',
+                                       last_name='Фамилия',
+                                       email='user@gmail.com')
+        cls.token = Token.objects.create(user=cls.user)
+        unit = Unit.objects.create(name='г')
+        cabbage, butter = Ingredient.objects.bulk_create([
+            Ingredient(name='Капуста', unit=unit),
+            Ingredient(name='Масло', unit=unit),
+        ])
+        recipes = Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {index}',
+                   author=cls.user,
+                   image='recipes/image.png',
+                   text='Описание',
+                   cooking_time=10)
+            for index in range(2)
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipes[0], ingredient=cabbage,
+                             amount=10),
+            RecipeIngredient(recipe=recipes[0], ingredient=butter, amount=5),
+            RecipeIngredient(recipe=recipes[1], ingredient=cabbage,
+                             amount=20),
+        ])
+        cls.recipes = recipes
+        cls.url = reverse('api:recipes-get-shopping-cart-file')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        for recipe in self.recipes:
+            response = self.client.post(self.cart_url(recipe))
+            self.assertEqual(response.status_code, HTTPStatus.CREATED)
+
+    @staticmethod
+    def cart_url(recipe):
+        return reverse('api:recipes-recipe-shopping-cart', args=(recipe.id,))
+
+    def download(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return b''.join(response.streaming_content).decode()
+
+    def test_txt_is_default(self):
+        self.assertEqual(self.download(),
+                         'Ингредиенты:\nКапуста: 30 (г)\nМасло: 5 (г)\n')
+
+    def test_csv(self):
+        rows = list(csv.reader(io.StringIO(self.download(format='csv'))))
+        self.assertEqual(rows, [['name', 'amount', 'unit'],
+                                ['Капуста', '30', 'г'],
+                                ['Масло', '5', 'г']])
+
+    def test_json(self):
+        self.assertEqual(json.loads(self.download(format='json')), [
+            {'name': 'Капуста', 'unit': 'г', 'amount': 30},
+            {'name': 'Масло', 'unit': 'г', 'amount': 5},
+        ])
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(self.url, {'format': 'xml'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('txt, csv, json', response.json()['format'])
+
+    def test_removing_recipe_updates_totals(self):
+        response = self.client.delete(self.cart_url(self.recipes[0]))
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(self.download(), 'Ингредиенты:\nКапуста: 20 (г)\n')
+        self.assertEqual(ShoppingCartIngredient.objects.count(), 1)
+
+    def test_deleting_recipe_updates_totals(self):
+        self.recipes[1].delete()
+        self.assertEqual(self.download(),
+                         'Ингредиенты:\nКапуста: 10 (г)\nМасло: 5 (г)\n')
+
+    def test_reconcile_finds_drift(self):
+        output = io.StringIO()
+        call_command('reconcile_shopping_carts', stdout=output)
+        self.assertIn('Расхождений не найдено', output.getvalue())
+        ShoppingCartIngredient.objects.filter(user=self.user).update(amount=1)
+        call_command('reconcile_shopping_carts', '--fix', stdout=output)
+        self.assertEqual(self.download(),
+                         'Ингредиенты:\nКапуста: 30 (г)\nМасло: 5 (г)\n')
+
+    def test_migration_backfills_totals(self):
+        migration = import_module('recipes.migrations.0006_auto_20261018_1916')
+        ShoppingCartIngredient.objects.all().delete()
+        migration.fill_cart_totals(apps, None)
+        self.assertEqual(self.download(),
+                         'Ингредиенты:\nКапуста: 30 (г)\nМасло: 5 (г)\n')
+
+    def test_admin_ingredient_edit_updates_totals(self):
+        admin = User.objects.create(username='admin',
+                                    email='admin@gmail.com',
+                                    is_staff=True,
+                                    is_superuser=True)
+        client = Client()
+        client.force_login(admin)
+        recipe = self.recipes[0]
+        links = list(recipe.recipeingredient_set.order_by('pk'))
+        data = {
+            'author': recipe.author_id,
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'recipeingredient_set-TOTAL_FORMS': len(links),
+            'recipeingredient_set-INITIAL_FORMS': len(links),
+            'recipeingredient_set-MIN_NUM_FORMS': 0,
+            'recipeingredient_set-MAX_NUM_FORMS': 1000,
+        }
+        for index, link in enumerate(links):
+            prefix = f'recipeingredient_set-{index}-'
+            data.update({
+                f'{prefix}id': link.pk,
+                f'{prefix}recipe': recipe.pk,
+                f'{prefix}ingredient': link.ingredient_id,
+                f'{prefix}amount': 15 if index == 0 else link.amount,
+            })
+        data['recipeingredient_set-1-DELETE'] = 'on'
+        response = client.post(
+            reverse('admin:recipes_recipe_change', args=(recipe.pk,)), data
+        )
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.assertEqual(self.download(), 'Ингредиенты:\nКапуста: 35 (г)\n')
+
+    def test_bulk_cart_and_favorites(self):
+        url = reverse('api:recipes-recipes-shopping-cart-bulk')
+        ids = [self.recipes[0].id, self.recipes[0].id, 999999]
+        response = self.client.delete(url, {'recipes': ids},
+                                      content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'], [
+            {'id': self.recipes[0].id, 'status': 'removed'},
+            {'id': 999999, 'status': 'not_found'},
+        ])
+        self.assertEqual(self.download(), 'Ингредиенты:\nКапуста: 20 (г)\n')
+
+        ids = [recipe.id for recipe in self.recipes]
+        response = self.client.post(url, {'recipes': ids},
+                                    content_type='application/json')
+        self.assertEqual([result['status']
+                          for result in response.json()['results']],
+                         ['added', 'already_added'])
+        self.assertEqual(self.download(),
+                         'Ингредиенты:\nКапуста: 30 (г)\nМасло: 5 (г)\n')
+
+        url = reverse('api:recipes-favorite-recipes-bulk')
+        response = self.client.post(url, {'recipes': ids},
+                                    content_type='application/json')
+        self.assertEqual([result['status']
+                          for result in response.json()['results']],
+                         ['added', 'added'])
+        response = self.client.post(url, {'recipes': []},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
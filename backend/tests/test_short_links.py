@@ -0,0 +1,106 @@
+from http import HTTPStatus
+from importlib import import_module
+
+from api.utils import encode_shortcode, is_valid_shortcode
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from recipes.models import Recipe, ShortUrl
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+class TestShortLinks(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='user',
+                                   email='user@gmail.com')
+        cls.recipe = Recipe.objects.create(name='Рецепт',
+                                           author=user,
+                                           image='recipes/image.png',
+                                           text='Описание',
+                                           cooking_time=10)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get_link(self):
+        response = self.client.get(reverse('api:recipes-get-short-link',
+                                           args=(self.recipe.id,)))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response.json()['short-link']
+
+    def test_codes_are_deterministic(self):
+        codes = {encode_shortcode(pk) for pk in range(5000)}
+        self.assertEqual(len(codes), 5000)
+        self.assertTrue(all(is_valid_shortcode(code) for code in codes))
+        code = encode_shortcode(12345)
+        self.assertFalse(is_valid_shortcode(code[:-1] + (
+            'a' if code[-1] != 'a' else 'b'
+        )))
+
+    @override_settings(ALLOWED_HOSTS=['*'])
+    def test_link_is_derived_and_redirects(self):
+        link = self.get_link()
+        self.assertEqual(self.get_link(), link)
+        self.assertFalse(ShortUrl.objects.exists())
+        shortcode = encode_shortcode(self.recipe.id)
+        self.assertTrue(link.endswith(f'/s/{shortcode}/'))
+        response = self.client.get(f'/s/{shortcode}/')
+        self.assertRedirects(
+            response, f'http://testserver/api/recipes/{self.recipe.id}/',
+            fetch_redirect_response=False
+        )
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/s/{shortcode}/', secure=True,
+                                       HTTP_HOST='other.example')
+        self.assertRedirects(
+            response, f'https://other.example/api/recipes/{self.recipe.id}/',
+            fetch_redirect_response=False
+        )
+
+    def test_unknown_codes(self):
+        with self.assertNumQueries(0):
+            for code in ('zzzzz', 'abc-def_ghi-jkl'):
+                response = self.client.get(f'/s/{code}/')
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        response = self.client.get(f'/s/{encode_shortcode(999999)}/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_legacy_codes_resolve(self):
+        legacy = ShortUrl.objects.create(recipe=self.recipe,
+                                         shortcode='AbCdEfGhIjKlMnO')
+        response = self.client.get(f'/s/{legacy.shortcode}/')
+        self.assertRedirects(
+            response, f'http://testserver/api/recipes/{self.recipe.id}/',
+            fetch_redirect_response=False
+        )
+        legacy.delete()
+        response = self.client.get(f'/s/{legacy.shortcode}/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        orphan = ShortUrl.objects.create(shortcode='OnMlKjIhGfEdCbA')
+        response = self.client.get(f'/s/{orphan.shortcode}/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_migration_keeps_issued_codes(self):
+        for shortcode in ('AbCdEfGhIjKlMnO', 'OnMlKjIhGfEdCbA'):
+            ShortUrl.objects.create(recipe=self.recipe, shortcode=shortcode)
+        migration = import_module('recipes.migrations.0012_shorturl_unique')
+        migration.check_duplicates(apps, None)
+        self.assertEqual(ShortUrl.objects.count(), 2)
+
+    def test_deleted_recipe_link_stops_resolving(self):
+        recipe = Recipe.objects.create(name='Удаляемый рецепт',
+                                       author=self.recipe.author,
+                                       image='recipes/image.png',
+                                       text='Описание',
+                                       cooking_time=10)
+        path = f'/s/{encode_shortcode(recipe.id)}/'
+        self.assertEqual(self.client.get(path).status_code, HTTPStatus.FOUND)
+        recipe.delete()
+        self.assertEqual(self.client.get(path).status_code,
+                         HTTPStatus.NOT_FOUND)
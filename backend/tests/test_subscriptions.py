@@ -0,0 +1,138 @@
+import io
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Follower, Recipe
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+RECIPES_PER_AUTHOR = 4
+
+
+class TestSubscriptionsQueries(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user',
+                                       first_name='Имя',
+                                       last_name='Фамилия',
+                                       email='user@gmail.com')
+        cls.token = Token.objects.create(user=cls.user)
+        cls.url = reverse('api:users-get-subscriptions')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def subscribe_to_authors(self, count):
+        start = User.objects.count()
+        authors = User.objects.bulk_create([
+            User(username=f'author{index}',
+                 first_name='Автор',
+                 last_name='Фамилия',
+                 email=f'author{index}@gmail.com')
+            for index in range(start, start + count)
+        ])
+        Recipe.objects.bulk_create([
+            Recipe(name=f'Рецепт {author.username} {index}',
+                   author=author,
+                   image='recipes/image.png',
+                   text='Описание',
+                   cooking_time=10)
+            for author in authors
+            for index in range(RECIPES_PER_AUTHOR)
+        ])
+        Follower.objects.bulk_create([
+            Follower(user=self.user, following_user=author,
+                     is_subscribed=True)
+            for author in authors
+        ])
+        call_command('recount_user_counters', stdout=io.StringIO())
+
+    def count_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url,
+                                       {'recipes_limit': 2, 'limit': 100})
+        return len(context.captured_queries), response.json()
+
+    def test_constant_queries(self):
+        self.subscribe_to_authors(3)
+        small, _ = self.count_queries()
+        self.subscribe_to_authors(30)
+        large, data = self.count_queries()
+        self.assertEqual(small, large)
+        self.assertEqual(data['count'], 33)
+        for author in data['results']:
+            self.assertEqual(author['recipes_count'], RECIPES_PER_AUTHOR)
+            self.assertEqual(len(author['recipes']), 2)
+        latest = Recipe.objects.filter(
+            author=data['results'][0]['id']
+        ).order_by('-created_at', '-pk').values_list('name', flat=True)[:2]
+        self.assertEqual([recipe['name']
+                          for recipe in data['results'][0]['recipes']],
+                         list(latest))
+
+    def test_users_list_resolves_subscriptions_in_constant_queries(self):
+        url = reverse('api:users-list')
+        self.subscribe_to_authors(3)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url, {'limit': 100})
+        self.subscribe_to_authors(20)
+        User.objects.create(username='stranger',
+                            first_name='Имя',
+                            last_name='Фамилия',
+                            email='stranger@gmail.com')
+        cache.clear()
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, {'limit': 100})
+        self.assertEqual(len(small.captured_queries),
+                         len(large.captured_queries))
+        subscribed = {user['username']: user['is_subscribed']
+                      for user in response.json()['results']}
+        self.assertFalse(subscribed.pop('user'))
+        self.assertFalse(subscribed.pop('stranger'))
+        self.assertTrue(all(subscribed.values()))
+
+        response = self.client.get(reverse('api:users-me'))
+        self.assertFalse(response.json()['is_subscribed'])
+        response = Client().get(url)
+        self.assertFalse(any(user['is_subscribed']
+                             for user in response.json()['results']))
+
+    def test_profile_counters(self):
+        self.subscribe_to_authors(2)
+        author = User.objects.get(username='author1')
+        self.assertEqual(author.recipes_count, RECIPES_PER_AUTHOR)
+        self.assertEqual(author.followers_count, 1)
+        url = reverse('api:users-subscription', args=(author.id,))
+        self.assertEqual(self.client.delete(url).status_code,
+                         HTTPStatus.NO_CONTENT)
+        self.assertEqual(self.client.delete(url).status_code,
+                         HTTPStatus.BAD_REQUEST)
+        self.assertEqual(self.client.post(url).status_code,
+                         HTTPStatus.CREATED)
+        self.assertEqual(self.client.post(url).status_code,
+                         HTTPStatus.BAD_REQUEST)
+        Recipe.objects.filter(author=author).first().delete()
+
+        response = self.client.get(reverse('api:users-detail',
+                                           args=(author.id,)))
+        data = response.json()
+        self.assertEqual(data['recipes_count'], RECIPES_PER_AUTHOR - 1)
+        self.assertEqual(data['followers_count'], 1)
+        self.assertEqual(data['following_count'], 0)
+        me = self.client.get(reverse('api:users-me')).json()
+        self.assertEqual(me['following_count'], 2)
+
+        User.objects.update(recipes_count=0)
+        output = io.StringIO()
+        call_command('recount_user_counters', stdout=output)
+        self.assertIn('Исправлено пользователей: 2', output.getvalue())
@@ -0,0 +1,72 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from recipes.models import (Follower, Ingredient, Recipe,
+                            ShoppingCartIngredient, Unit, UserRecipe)
+
+
+class TestSyntheticBenchmark(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        unit = Unit.objects.create(name='г')
+        Ingredient.objects.bulk_create([
+            Ingredient(name=f'Ингредиент {index}', unit=unit)
+            for index in range(20)
+        ])
+        call_command('generate_data', '--users', '8', '--recipes', '40',
+                     '--follows', '3', '--favorites', '5', '--carts', '3',
+                     stdout=io.StringIO())
+
+    def setUp(self):
+        cache.clear()
+
+    def benchmark(self, *args):
+        output = io.StringIO()
+        call_command('benchmark_api', '--repeat', '2', '--warmup', '0',
+                     '--memory-repeat', '1', *args, stdout=output)
+        return json.loads(output.getvalue())
+
+    def test_generated_data_is_consistent(self):
+        self.assertEqual(Recipe.objects.count(), 40)
+        self.assertTrue(Follower.objects.exists())
+        self.assertTrue(UserRecipe.objects.filter(is_favorite=True).exists())
+        self.assertTrue(ShoppingCartIngredient.objects.exists())
+        for command in ('recount_recipe_counters', 'recount_user_counters',
+                        'reconcile_shopping_carts'):
+            output = io.StringIO()
+            call_command(command, stdout=output)
+            self.assertIn('Расхождений не найдено', output.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('generate_data', stdout=io.StringIO())
+
+    def test_benchmark_report(self):
+        report = self.benchmark()
+        self.assertEqual(report['dataset']['recipes'], 40)
+        self.assertEqual(report['skipped'], {})
+        self.assertIn('download_shopping_cart_user', report['scenarios'])
+        self.assertIn('get_subscription_list_user', report['scenarios'])
+        for result in report['scenarios'].values():
+            self.assertEqual(result['status'], {'200': 2})
+            self.assertEqual(set(result['latency_ms']),
+                             {'p50', 'p95', 'p99', 'mean'})
+            self.assertIn('peak', result['memory_kb'])
+
+    def test_compare_reports_regressions(self):
+        report = self.benchmark('--scenario', 'get_recipes_list_user')
+        for result in report['scenarios'].values():
+            result['latency_ms']['p95'] = 0
+            result['queries']['p50'] = 0
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(report, file)
+            with self.assertRaises(CommandError):
+                self.benchmark('--scenario', 'get_recipes_list_user',
+                               '--compare', path)
@@ -0,0 +1,89 @@
+import threading
+from collections import Counter
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TransactionTestCase
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCartIngredient, Unit, UserRecipe)
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+
+User = get_user_model()
+
+
+class TestConcurrentToggles(TransactionTestCase):
+    THREADS = 16
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='user',
+                                        first_name='Имя',
+                                        last_name='Фамилия',
+                                        email='user@gmail.com')
+        self.token = Token.objects.create(user=self.user)
+        unit = Unit.objects.create(name='г')
+        ingredient = Ingredient.objects.create(name='Капуста', unit=unit)
+        self.recipe = Recipe.objects.create(name='Рецепт',
+                                            author=self.user,
+                                            image='recipes/image.png',
+                                            text='Описание',
+                                            cooking_time=10)
+        RecipeIngredient.objects.create(recipe=self.recipe,
+                                        ingredient=ingredient,
+                                        amount=10)
+
+    def hammer(self, method, url):
+        barrier = threading.Barrier(self.THREADS)
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def request():
+            client = Client(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            try:
+                barrier.wait()
+                response = getattr(client, method)(url)
+                with lock:
+                    statuses[response.status_code] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=request)
+                   for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_concurrent_toggles_apply_once(self):
+        for url_name in ('api:recipes-favorite-recipe',
+                         'api:recipes-recipe-shopping-cart'):
+            url = reverse(url_name, args=(self.recipe.id,))
+            statuses = self.hammer('post', url)
+            self.assertEqual(statuses[HTTPStatus.CREATED], 1)
+            self.assertEqual(statuses[HTTPStatus.BAD_REQUEST],
+                             self.THREADS - 1)
+        user_recipe = UserRecipe.objects.get(user=self.user)
+        self.assertTrue(user_recipe.is_favorite)
+        self.assertTrue(user_recipe.is_in_shopping_cart)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.in_carts_count, 1)
+        self.assertEqual(
+            ShoppingCartIngredient.objects.get(user=self.user).amount, 10
+        )
+
+        url = reverse('api:recipes-recipe-shopping-cart',
+                      args=(self.recipe.id,))
+        statuses = self.hammer('delete', url)
+        self.assertEqual(statuses[HTTPStatus.NO_CONTENT], 1)
+        self.assertEqual(statuses[HTTPStatus.BAD_REQUEST], self.THREADS - 1)
+        self.assertFalse(
+            ShoppingCartIngredient.objects.filter(user=self.user).exists()
+        )
+        self.assertEqual(UserRecipe.objects.filter(user=self.user).count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.in_carts_count, 0)
@@ -15,10 +15,30 @@ class User(AbstractUser):
                               verbose_name='почта')
     avatar = models.ImageField(upload_to='users/', null=True,
                                verbose_name='аватарка')
+    recipes_count = models.PositiveIntegerField(default=0,
+                                                editable=False,
+                                                verbose_name='рецептов')
+    followers_count = models.PositiveIntegerField(default=0,
+                                                  editable=False,
+                                                  verbose_name='подписчиков')
+    following_count = models.PositiveIntegerField(default=0,
+                                                  editable=False,
+                                                  verbose_name='подписок')
     REQUIRED_FIELDS = ['first_name',
                        'last_name',
                        'email',
                        'avatar']
+    COUNTER_FIELDS = ('recipes_count', 'followers_count', 'following_count')
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None and not (kwargs.get('update_fields')
+                                        or kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     class Meta:
         verbose_name = 'Пользователь'